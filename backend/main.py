@@ -1,22 +1,57 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import os
+import asyncio
+import json
+import time
 from dotenv import load_dotenv
 import base64
 from pathlib import Path
-import shutil
 from services.video_processor import VideoProcessor
 from services.claude_analyzer import ClaudeAnalyzer
 from services.idea_analyzer import IdeaAnalyzer
 from services.market_insights_analyzer import MarketInsightsAnalyzer
+from services.llm_client import LLMClient
+from services.http_fetcher import HttpFetcher
+from services.page_enricher import PageEnricher
+from services.llm_cache import DiskCache, LLMResponseCache
+from services.artifact_cache import ArtifactCache
+from services.upload_store import ingest_upload, UploadTooLargeError
+from services.patent_index import PatentIndex
+from services.patent_embeddings import PatentEmbeddings
+from services.job_queue import JobQueue, JobStore, JobProgress, QueueFullError
+from services.media_worker import RemoteVideoProcessor, MediaWorkerBusyError
 
 load_dotenv()
 
 app = FastAPI(title="Pitch Coach API")
 
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+# Paths that accept video uploads (checked by the size-limit middleware)
+UPLOAD_PATHS = {"/api/analyze-pitch", "/api/analyze-pitch/stream", "/api/jobs/analyze-pitch"}
+
+
+# Registered before CORS so CORS (the outer middleware) still decorates 413s
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Reject uploads whose declared size is over the limit before the body is read.
+    Uploads without a Content-Length are still capped while streaming to disk.
+    """
+    if request.method == "POST" and request.url.path in UPLOAD_PATHS:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Video exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"}
+            )
+    return await call_next(request)
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -30,11 +65,50 @@ app.add_middleware(
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Job uploads are kept until their job finishes, so they survive a restart
+JOB_UPLOAD_DIR = UPLOAD_DIR / "jobs"
+JOB_UPLOAD_DIR.mkdir(exist_ok=True)
+
 # Initialize services
-video_processor = VideoProcessor()
-claude_analyzer = ClaudeAnalyzer(api_key=os.getenv("ANTHROPIC_API_KEY"))
-idea_analyzer = IdeaAnalyzer(anthropic_api_key=os.getenv("ANTHROPIC_API_KEY"))
-market_insights_analyzer = MarketInsightsAnalyzer(anthropic_api_key=os.getenv("ANTHROPIC_API_KEY"))
+# With MEDIA_WORKER_SOCKET set, video work goes to a shared media worker
+# (python -m services.media_worker) instead of loading Whisper in every API
+# worker; the worker owns the artifact cache then
+if os.getenv("MEDIA_WORKER_SOCKET"):
+    artifact_cache = None
+    video_processor = RemoteVideoProcessor(os.getenv("MEDIA_WORKER_SOCKET"))
+else:
+    artifact_cache = ArtifactCache(
+        cache_dir=os.getenv("ARTIFACT_CACHE_DIR", "cache/artifacts"),
+        max_bytes=int(os.getenv("ARTIFACT_CACHE_MAX_MB", "500")) * 1024 * 1024
+    )
+    video_processor = VideoProcessor(artifact_cache=artifact_cache)
+llm_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+    disk_path=os.getenv("LLM_CACHE_PATH") or None
+)
+llm_client = LLMClient(api_key=os.getenv("ANTHROPIC_API_KEY"), cache=llm_cache)
+claude_analyzer = ClaudeAnalyzer(llm_client=llm_client)
+http_fetcher = HttpFetcher()
+patent_index = PatentIndex(os.getenv("PATENT_INDEX_DIR", "data/patent_index"))
+patent_embeddings = PatentEmbeddings(os.getenv("PATENT_INDEX_DIR", "data/patent_index"))
+idea_analyzer = IdeaAnalyzer(
+    llm_client=llm_client,
+    http_fetcher=http_fetcher,
+    patent_index=patent_index,
+    patent_embeddings=patent_embeddings
+)
+web_search_cache = DiskCache(os.getenv("WEB_SEARCH_CACHE_PATH", "cache/web_search.db"), table="web_search")
+market_insights_analyzer = MarketInsightsAnalyzer(
+    llm_client=llm_client,
+    http_fetcher=http_fetcher,
+    search_cache=web_search_cache,
+    search_cache_ttl=float(os.getenv("WEB_SEARCH_CACHE_TTL", "86400")),
+    page_enricher=PageEnricher(http_fetcher)
+)
+
+
+VALID_PERSONAS = ["investor", "advisor", "healthcare", "edtech", "tech"]
 
 
 # Pydantic models for request validation
@@ -42,6 +116,7 @@ class IdeaAnalysisRequest(BaseModel):
     idea_description: str
     keywords: Optional[List[str]] = None
     industry: Optional[str] = None
+    use_cache: bool = True
 
 
 class MarketInsightsRequest(BaseModel):
@@ -53,6 +128,54 @@ class MarketInsightsRequest(BaseModel):
     unique_value: Optional[str] = None
     business_model: Optional[str] = None
     geographic_regions: Optional[str] = None
+    use_cache: bool = True
+
+
+# Background warm-up of heavy subsystems, started after the server is listening
+warmup_task: Optional[asyncio.Task] = None
+warmup_errors = {}
+
+
+async def warm_up():
+    """
+    Load OpenCV, Whisper, the Anthropic SDK and (if installed) the patent
+    embedding model off the request path.
+    A failure is recorded for /health/ready; the subsystem then loads on first use.
+    """
+    async def warm(name, coro):
+        start_time = time.perf_counter()
+        try:
+            await coro
+            print(f"Warmed up {name} in {time.perf_counter() - start_time:.1f}s")
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+            warmup_errors[name] = str(e)
+
+    await asyncio.gather(
+        warm("video", video_processor.warm_up()),
+        warm("llm", llm_client.warm_up()),
+        warm("patent_embeddings", asyncio.to_thread(patent_embeddings.warm_up))
+    )
+
+
+@app.on_event("startup")
+async def startup():
+    global warmup_task
+    await job_queue.start()
+    warmup_task = asyncio.create_task(warm_up())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if warmup_task:
+        warmup_task.cancel()
+    await job_queue.stop()
+    job_store.close()
+    await llm_client.close()
+    await http_fetcher.close()
+    web_search_cache.close()
+    patent_index.close()
+    video_processor.shutdown()
 
 
 @app.get("/")
@@ -61,57 +184,395 @@ async def root():
 
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
+    """
+    Liveness: the process is up and serving requests
+    """
     return {"status": "healthy"}
 
 
-@app.post("/api/analyze-pitch")
-async def analyze_pitch(
-    video: UploadFile = File(...),
-    persona: str = Form(...)
-):
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once every subsystem is warm, 503 (with the same body) until then
+    """
+    subsystems = {**video_processor.get_readiness(), "llm_client": llm_client.is_ready()}
+    ready = all(subsystems.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "warming_up",
+            "subsystems": subsystems,
+            "errors": warmup_errors
+        }
+    )
+
+
+async def get_artifact_stats() -> Optional[dict]:
+    if artifact_cache:
+        return await asyncio.to_thread(artifact_cache.get_stats)
+    try:
+        return (await video_processor.get_worker_stats()).get("artifacts")
+    except OSError as e:
+        return {"error": f"Media worker not reachable: {e}"}
+
+
+@app.get("/api/stats")
+async def stats():
+    """
+    Runtime diagnostics: LLM concurrency, response cache hit/miss counters,
+    video processing pool queue depth, artifact cache usage, job queue depth
+    and patent index size
+    """
+    return {
+        "llm": llm_client.get_stats(),
+        "video": video_processor.get_pool_stats(),
+        "artifacts": await get_artifact_stats(),
+        "jobs": job_queue.get_stats(),
+        "http": http_fetcher.get_stats(),
+        "patents": await asyncio.to_thread(patent_index.get_stats)
+    }
+
+
+def parse_personas(persona: str) -> List[str]:
     """
-    Analyze a pitch video with the selected persona
+    Expand the persona form field into a validated list of personas.
+    Accepts a single persona, a comma-separated list, or "all".
     """
-    valid_personas = ["investor", "advisor", "healthcare", "edtech", "tech"]
-    if persona not in valid_personas:
+    if persona.strip() == "all":
+        return list(VALID_PERSONAS)
+
+    personas = []
+    for name in persona.split(","):
+        name = name.strip()
+        if name not in VALID_PERSONAS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Persona must be one of: {', '.join(VALID_PERSONAS)} (or a comma-separated list, or 'all')"
+            )
+        if name not in personas:
+            personas.append(name)
+    return personas
+
+
+def validate_frame_sampling(frame_sampling: str):
+    valid_samplings = ["uniform", "scene"]
+    if frame_sampling not in valid_samplings:
         raise HTTPException(
             status_code=400,
-            detail=f"Persona must be one of: {', '.join(valid_personas)}"
+            detail=f"Frame sampling must be one of: {', '.join(valid_samplings)}"
         )
 
-    # Save uploaded video
-    video_path = UPLOAD_DIR / f"temp_{video.filename}"
-    try:
-        with video_path.open("wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
 
-        # Process video: extract frames and transcribe audio
-        print("Processing video...")
-        frames, transcript = await video_processor.process_video(str(video_path))
+def validate_transcription_profile(transcription_profile: str):
+    valid_profiles = list(VideoProcessor.TRANSCRIPTION_PROFILES)
+    if transcription_profile not in valid_profiles:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Transcription profile must be one of: {', '.join(valid_profiles)}"
+        )
 
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Format one Server-Sent Event
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def run_pitch_analysis(
+    video_path: str,
+    content_hash: str,
+    personas: List[str],
+    frame_sampling: str,
+    use_cache: bool,
+    transcription_profile: Optional[str] = None,
+    progress: Optional[JobProgress] = None
+) -> dict:
+    """
+    Process a saved pitch video once and analyze it for each persona.
+    Returns the /api/analyze-pitch response body. When a job progress
+    reporter is given, per-stage progress is recorded on it.
+    """
+    # Process video: extract frames and transcribe audio
+    print("Processing video...")
+    if progress:
+        await progress.start("frames", "transcription")
+    frames, transcript, transcription_info = await video_processor.process_video(
+        video_path,
+        frame_sampling=frame_sampling,
+        content_hash=content_hash,
+        on_stage_complete=progress.done if progress else None,
+        transcription_profile=transcription_profile
+    )
+
+    if progress:
+        await progress.start("llm")
+
+    if len(personas) > 1:
+        # One processing pass, fanned out to every persona
+        print(f"Analyzing pitch with {', '.join(personas)} personas...")
+        analyses = await claude_analyzer.analyze_pitch_multi(
+            frames=frames,
+            transcript=transcript,
+            personas=personas,
+            use_cache=use_cache
+        )
+        result = {
+            "success": True,
+            "transcript": transcript,
+            "analyses": analyses,
+            "personas": personas,
+            "transcription": transcription_info
+        }
+    else:
         # Analyze with Claude
+        persona = personas[0]
         print(f"Analyzing pitch with {persona} persona...")
         analysis = await claude_analyzer.analyze_pitch(
             frames=frames,
             transcript=transcript,
-            persona=persona
+            persona=persona,
+            use_cache=use_cache
         )
-
-        return JSONResponse(content={
+        result = {
             "success": True,
             "transcript": transcript,
             "analysis": analysis,
-            "persona": persona
-        })
+            "persona": persona,
+            "transcription": transcription_info
+        }
+
+    if progress:
+        await progress.done("llm")
+    return result
+
+
+async def run_pitch_job(job_id: str, params: dict, progress: JobProgress) -> dict:
+    return await run_pitch_analysis(
+        params["video_path"],
+        params["content_hash"],
+        params["personas"],
+        params["frame_sampling"],
+        params["use_cache"],
+        transcription_profile=params.get("transcription_profile"),
+        progress=progress
+    )
+
+
+def cleanup_job_upload(job: dict):
+    Path(job["params"]["video_path"]).unlink(missing_ok=True)
+
+
+job_store = JobStore(os.getenv("JOB_DB_PATH", "cache/jobs.db"))
+job_queue = JobQueue(
+    store=job_store,
+    handler=run_pitch_job,
+    stages=["upload", "frames", "transcription", "llm"],
+    max_workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_QUEUE_MAX", "100")),
+    on_finished=cleanup_job_upload,
+    retention=float(os.getenv("JOB_RETENTION_HOURS", "168")) * 3600
+)
+
+
+@app.post("/api/analyze-pitch")
+async def analyze_pitch(
+    video: UploadFile = File(...),
+    persona: str = Form(...),
+    use_cache: bool = Form(True),
+    frame_sampling: str = Form("uniform"),
+    transcription_profile: str = Form(video_processor.default_profile)
+):
+    """
+    Analyze a pitch video with the selected persona.
+
+    persona may also be a comma-separated list (e.g. "investor,tech") or "all":
+    the video is then processed once and every persona is analyzed concurrently,
+    with results returned per persona under "analyses".
+    """
+    personas = parse_personas(persona)
+    validate_frame_sampling(frame_sampling)
+    validate_transcription_profile(transcription_profile)
+
+    upload = None
+    try:
+        # Stream uploaded video to a unique temp file, hashing as we go
+        upload = await ingest_upload(video, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+        print(f"Received video {upload.sha256[:12]} ({upload.size} bytes)")
+
+        result = await run_pitch_analysis(
+            str(upload.path), upload.sha256, personas, frame_sampling, use_cache,
+            transcription_profile=transcription_profile
+        )
+        return JSONResponse(content=result)
+
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    except MediaWorkerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing video: {str(e)}")
 
     finally:
         # Cleanup
-        if video_path.exists():
-            video_path.unlink()
+        if upload and upload.path.exists():
+            upload.path.unlink()
+
+
+@app.post("/api/analyze-pitch/stream")
+async def analyze_pitch_stream(
+    video: UploadFile = File(...),
+    persona: str = Form(...),
+    use_cache: bool = Form(True),
+    frame_sampling: str = Form("uniform"),
+    transcription_profile: str = Form(video_processor.default_profile)
+):
+    """
+    Analyze a pitch video with the selected persona, streaming progress as
+    Server-Sent Events:
+        - status: {"stage"} when video processing / analysis starts
+        - transcript: {"transcript"} once transcription is done
+        - token: {"text"} for each chunk of feedback from Claude
+        - section: {"name", "content"} as each feedback section completes
+        - result: same body as /api/analyze-pitch
+        - error: {"detail"} if anything fails
+    """
+    personas = parse_personas(persona)
+    if len(personas) != 1:
+        raise HTTPException(status_code=400, detail="Streaming supports a single persona")
+    persona = personas[0]
+    validate_frame_sampling(frame_sampling)
+    validate_transcription_profile(transcription_profile)
+
+    # Ingest before responding: the upload is closed once the endpoint returns
+    try:
+        upload = await ingest_upload(video, UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    async def events():
+        try:
+            yield sse_event("status", {"stage": "processing_video"})
+            frames, transcript, transcription_info = await video_processor.process_video(
+                str(upload.path),
+                frame_sampling=frame_sampling,
+                content_hash=upload.sha256,
+                transcription_profile=transcription_profile
+            )
+            yield sse_event("transcript", {"transcript": transcript})
+
+            yield sse_event("status", {"stage": "analyzing"})
+            async for event in claude_analyzer.stream_pitch_analysis(
+                frames=frames,
+                transcript=transcript,
+                persona=persona,
+                use_cache=use_cache
+            ):
+                if event["event"] == "analysis":
+                    yield sse_event("result", {
+                        "success": True,
+                        "transcript": transcript,
+                        "analysis": event["data"],
+                        "persona": persona,
+                        "transcription": transcription_info
+                    })
+                else:
+                    yield sse_event(event["event"], event["data"])
+
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error processing video: {str(e)}"})
+
+        finally:
+            # Cleanup
+            if upload.path.exists():
+                upload.path.unlink()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/jobs/analyze-pitch", status_code=202)
+async def submit_pitch_job(
+    video: UploadFile = File(...),
+    persona: str = Form(...),
+    use_cache: bool = Form(True),
+    frame_sampling: str = Form("uniform"),
+    transcription_profile: str = Form(video_processor.default_profile)
+):
+    """
+    Queue a pitch analysis and return its job id immediately.
+    Accepts the same fields as /api/analyze-pitch; poll /api/jobs/{job_id}
+    for progress and fetch /api/jobs/{job_id}/result when completed.
+    """
+    personas = parse_personas(persona)
+    validate_frame_sampling(frame_sampling)
+    validate_transcription_profile(transcription_profile)
+
+    try:
+        upload = await ingest_upload(video, JOB_UPLOAD_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        job_id = await job_queue.submit(
+            "analyze-pitch",
+            {
+                "video_path": str(upload.path),
+                "content_hash": upload.sha256,
+                "personas": personas,
+                "frame_sampling": frame_sampling,
+                "use_cache": use_cache,
+                "transcription_profile": transcription_profile
+            },
+            completed_stages=["upload"]
+        )
+    except QueueFullError as e:
+        upload.path.unlink(missing_ok=True)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Report job status and per-stage progress (upload, frames, transcription, llm)
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stages": job["stages"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Return the analysis for a completed job (same body as /api/analyze-pitch)
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Error processing video: {job['error']}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    return JSONResponse(content=job["result"])
 
 
 @app.post("/api/analyze-idea")
@@ -132,7 +593,8 @@ async def analyze_idea(request: IdeaAnalysisRequest):
         result = await idea_analyzer.analyze_idea(
             idea_description=request.idea_description,
             keywords=request.keywords,
-            industry=request.industry
+            industry=request.industry,
+            use_cache=request.use_cache
         )
 
         return JSONResponse(content=result)
@@ -166,7 +628,8 @@ async def analyze_market(request: MarketInsightsRequest):
             known_competitors=request.known_competitors,
             unique_value=request.unique_value,
             business_model=request.business_model,
-            geographic_regions=request.geographic_regions
+            geographic_regions=request.geographic_regions,
+            use_cache=request.use_cache
         )
 
         return JSONResponse(content=result)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ArtifactCache:
+    """
+    Persistent cache of video processing artifacts (frames, transcript and
+    transcription stats), keyed by the video's content hash and the processing parameters.
+
+    Entries are JSON files in a directory so they survive restarts. When the
+    directory grows past max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, **params) -> str:
+        """
+        Combine the video hash with every parameter that changes the output.
+        """
+        encoded = json.dumps({"content": content_hash, **params}, sort_keys=True)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[List[str], str, Optional[Dict[str, Any]]]]:
+        """
+        Return (frames, transcript, transcription_info) or None on a miss.
+        transcription_info is None for entries written without it.
+        """
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # Touch so eviction treats this entry as recently used
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry["frames"], entry["transcript"], entry.get("transcription_info")
+
+    def set(
+        self,
+        key: str,
+        frames: List[str],
+        transcript: str,
+        transcription_info: Optional[Dict[str, Any]] = None
+    ):
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({
+                "frames": frames,
+                "transcript": transcript,
+                "transcription_info": transcription_info,
+                "created_at": time.time()
+            }, f)
+        # Atomic rename so readers never see a half-written entry
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            # Oldest access first
+            for _, size, path in sorted(entries):
+                path.unlink(missing_ok=True)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def get_stats(self) -> Dict[str, Any]:
+        entries = list(self.cache_dir.glob("*.json"))
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size_bytes": sum(path.stat().st_size for path in entries if path.exists()),
+            "max_bytes": self.max_bytes
+        }
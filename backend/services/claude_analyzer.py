@@ -1,39 +1,203 @@
-from anthropic import Anthropic
-from typing import List, Dict
+import asyncio
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple
+from services.frame_dedup import FrameDeduplicator
+from services.llm_client import (
+    CACHE_CONTROL,
+    CHARS_PER_TOKEN,
+    MIN_CACHEABLE_TOKENS,
+    LLMClient,
+    UsageTracker,
+    prefix_block
+)
+
+
+class FeedbackSectionParser:
+    """
+    Splits feedback text into sections as it arrives. feed() returns every
+    section completed by the new text, i.e. sections whose following header
+    has now been seen; close() flushes the last one.
+    """
+
+    def __init__(self):
+        self.sections: Dict[str, str] = {}
+        self._current_section = "intro"
+        self._current_content: List[str] = []
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        completed = []
+        for line in lines:
+            section = self._process_line(line)
+            if section:
+                completed.append(section)
+        return completed
+
+    def close(self) -> List[Tuple[str, str]]:
+        completed = []
+        section = self._process_line(self._buffer)
+        self._buffer = ""
+        if section:
+            completed.append(section)
+
+        # Save last section
+        if self._current_content:
+            completed.append(self._save_current())
+        return completed
+
+    def _process_line(self, line: str) -> Optional[Tuple[str, str]]:
+        line = line.strip()
+        if not line:
+            return None
+
+        # Check if this is a section header
+        if line.startswith('#') or line.isupper() and len(line) < 50:
+            # Save previous section
+            completed = self._save_current() if self._current_content else None
+
+            # Start new section
+            section_name = line.replace('#', '').strip().lower()
+            self._current_section = section_name.replace(' ', '_')
+            return completed
+
+        self._current_content.append(line)
+        return None
+
+    def _save_current(self) -> Tuple[str, str]:
+        content = '\n'.join(self._current_content)
+        self.sections[self._current_section] = content
+        self._current_content = []
+        return self._current_section, content
 
 
 class ClaudeAnalyzer:
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
+    def __init__(self, llm_client: LLMClient):
+        self.llm_client = llm_client
+        self.frame_deduplicator = FrameDeduplicator()
+        self.max_images = 5  # Image budget per request to avoid token limits
         self.model = "claude-sonnet-4-20250514"  # Latest Claude Sonnet with vision
+        # Image tokens for one 640x480 frame (width * height / 750)
+        self.tokens_per_frame = 640 * 480 // 750
 
     async def analyze_pitch(
         self,
         frames: List[str],
         transcript: str,
-        persona: str
+        persona: str,
+        use_cache: bool = True
     ) -> Dict:
         """
         Analyze pitch using Claude with vision capabilities
         """
-        # Build the prompt based on persona
-        system_prompt = self._get_system_prompt(persona)
+        frames, frame_selection = await self._select_frames(frames)
+        return await self._analyze_selected_frames(
+            frames, frame_selection, transcript, persona, use_cache, cache_prefix=True
+        )
 
-        # Build message content with frames and transcript
-        content = self._build_message_content(frames, transcript)
+    async def analyze_pitch_multi(
+        self,
+        frames: List[str],
+        transcript: str,
+        personas: List[str],
+        use_cache: bool = True
+    ) -> Dict[str, Dict]:
+        """
+        Analyze the same pitch from several personas concurrently.
+        Frame selection runs once and is shared; a failing persona reports
+        its error without affecting the others.
+
+        Each persona's prefix starts with its own system prompt, so the
+        personas cannot share a cached prefix and none is marked here.
+        """
+        frames, frame_selection = await self._select_frames(frames)
+
+        results = await asyncio.gather(
+            *(
+                self._analyze_selected_frames(frames, frame_selection, transcript, persona, use_cache)
+                for persona in personas
+            ),
+            return_exceptions=True
+        )
+
+        analyses = {}
+        for persona, result in zip(personas, results):
+            if isinstance(result, Exception):
+                analyses[persona] = {"error": str(result)}
+            else:
+                analyses[persona] = result
+        return analyses
+
+    async def _select_frames(self, frames: List[str]) -> Tuple[List[str], Dict]:
+        """
+        Collapse near-duplicate frames so the image budget goes to distinct visuals
+        """
+        return await asyncio.to_thread(self.frame_deduplicator.select, frames, self.max_images)
+
+    async def stream_pitch_analysis(
+        self,
+        frames: List[str],
+        transcript: str,
+        persona: str,
+        use_cache: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a pitch analysis as events:
+        - {"event": "token", "data": {"text"}} for each text delta from Claude
+        - {"event": "section", "data": {"name", "content"}} as each section completes
+        - {"event": "analysis", "data": <same dict as analyze_pitch>} at the end
+        """
+        frames, frame_selection = await self._select_frames(frames)
+        parser = FeedbackSectionParser()
+        chunks = []
+        usage = UsageTracker()
+
+        try:
+            async for event in self.llm_client.stream_message(
+                use_cache=use_cache,
+                usage=usage,
+                **self._build_request(frames, transcript, persona, cache_prefix=True)
+            ):
+                if event["type"] != "text":
+                    continue
+
+                chunks.append(event["text"])
+                yield {"event": "token", "data": {"text": event["text"]}}
+                for name, content in parser.feed(event["text"]):
+                    yield {"event": "section", "data": {"name": name, "content": content}}
+
+        except Exception as e:
+            raise Exception(f"Claude API error: {str(e)}")
+
+        for name, content in parser.close():
+            yield {"event": "section", "data": {"name": name, "content": content}}
+
+        yield {
+            "event": "analysis",
+            "data": {
+                "raw_feedback": "".join(chunks),
+                "structured_feedback": parser.sections,
+                "frame_selection": frame_selection,
+                "token_usage": usage.as_dict()
+            }
+        }
 
+    async def _analyze_selected_frames(
+        self,
+        frames: List[str],
+        frame_selection: Dict,
+        transcript: str,
+        persona: str,
+        use_cache: bool,
+        cache_prefix: bool = False
+    ) -> Dict:
         # Call Claude API
+        usage = UsageTracker()
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ]
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
+                **self._build_request(frames, transcript, persona, cache_prefix)
             )
 
             # Parse the response
@@ -42,12 +206,51 @@ class ClaudeAnalyzer:
             # Structure the response
             return {
                 "raw_feedback": analysis_text,
-                "structured_feedback": self._parse_feedback(analysis_text)
+                "structured_feedback": self._parse_feedback(analysis_text),
+                "frame_selection": frame_selection,
+                "token_usage": usage.as_dict()
             }
 
         except Exception as e:
             raise Exception(f"Claude API error: {str(e)}")
 
+    def _build_request(
+        self,
+        frames: List[str],
+        transcript: str,
+        persona: str,
+        cache_prefix: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Build the messages.create arguments for a persona.
+
+        The persona system prompt and the pitch material (transcript and
+        frames) form the prefix; only the analysis request follows it. The
+        persona prompt carries a prompt-cache breakpoint once it is long
+        enough to be cached, and with cache_prefix the pitch material ends
+        in one when persona and material together are, so later analyses of
+        the same pitch by the same persona (e.g. with use_cache=False) read
+        the prefix instead of paying for it again.
+        """
+        # Build the prompt based on persona
+        system_prompt = self._get_system_prompt(persona)
+        cache_prefix = cache_prefix and self._is_prefix_cacheable(frames, transcript, system_prompt)
+
+        # Build message content with frames and transcript
+        content = self._build_message_content(frames, transcript, cache_prefix)
+
+        return {
+            "model": self.model,
+            "max_tokens": 4000,
+            "system": [prefix_block(system_prompt)],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ]
+        }
+
     def _get_system_prompt(self, persona: str) -> str:
         """
         Get system prompt based on selected persona
@@ -128,36 +331,22 @@ Be specific about technical strengths and potential technical risks. Structure y
 
         return "You are a professional pitch coach."
 
-    def _build_message_content(self, frames: List[str], transcript: str) -> List[Dict]:
+    def _is_prefix_cacheable(self, frames: List[str], transcript: str, system_prompt: str) -> bool:
         """
-        Build message content with frames and transcript
+        Whether system prompt and pitch material are (roughly) long enough
+        for the prompt cache
         """
-        content = []
-
-        # Add instruction text
-        content.append({
-            "type": "text",
-            "text": f"""Please analyze this pitch video. I've provided:
-1. Key frames from the video showing visual elements, slides, and body language
-2. A complete transcript of what was said
-
-TRANSCRIPT:
-{transcript}
-
-VIDEO FRAMES (shown below):
-"""
-        })
+        estimated = (
+            len(frames[:self.max_images]) * self.tokens_per_frame
+            + (len(system_prompt) + len(transcript)) // CHARS_PER_TOKEN
+        )
+        return estimated >= MIN_CACHEABLE_TOKENS
 
-        # Add frames (sample up to 5 to avoid token limits)
-        for i, frame_b64 in enumerate(frames[:5]):
-            content.append({
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/jpeg",
-                    "data": frame_b64
-                }
-            })
+    def _build_message_content(self, frames: List[str], transcript: str, cache_prefix: bool = False) -> List[Dict]:
+        """
+        Build message content: the pitch material, then the analysis request
+        """
+        content = self._build_pitch_content(frames, transcript, cache_prefix)
 
         # Add analysis request
         content.append({
@@ -195,34 +384,48 @@ Be specific, constructive, and actionable in your feedback.
 
         return content
 
-    def _parse_feedback(self, analysis_text: str) -> Dict:
+    def _build_pitch_content(self, frames: List[str], transcript: str, cache_prefix: bool = False) -> List[Dict]:
         """
-        Parse the feedback text into structured sections
+        Build the pitch material part of the message: transcript and frames
         """
-        sections = {}
-        current_section = "intro"
-        current_content = []
-
-        for line in analysis_text.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-
-            # Check if this is a section header
-            if line.startswith('#') or line.isupper() and len(line) < 50:
-                # Save previous section
-                if current_content:
-                    sections[current_section] = '\n'.join(current_content)
-                    current_content = []
-
-                # Start new section
-                section_name = line.replace('#', '').strip().lower()
-                current_section = section_name.replace(' ', '_')
-            else:
-                current_content.append(line)
+        content = []
 
-        # Save last section
-        if current_content:
-            sections[current_section] = '\n'.join(current_content)
+        # Add instruction text
+        content.append({
+            "type": "text",
+            "text": f"""Please analyze this pitch video. I've provided:
+1. Key frames from the video showing visual elements, slides, and body language
+2. A complete transcript of what was said
+
+TRANSCRIPT:
+{transcript}
 
-        return sections
+VIDEO FRAMES (shown below):
+"""
+        })
+
+        # Add frames (up to the image budget to avoid token limits)
+        for i, frame_b64 in enumerate(frames[:self.max_images]):
+            content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": "image/jpeg",
+                    "data": frame_b64
+                }
+            })
+
+        # Everything up to here is the same for every analysis of this pitch
+        if cache_prefix:
+            content[-1]["cache_control"] = CACHE_CONTROL
+
+        return content
+
+    def _parse_feedback(self, analysis_text: str) -> Dict:
+        """
+        Parse the feedback text into structured sections
+        """
+        parser = FeedbackSectionParser()
+        parser.feed(analysis_text)
+        parser.close()
+        return parser.sections
@@ -0,0 +1,102 @@
+import base64
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from services.lazy_imports import lazy_import
+
+# OpenCV is imported on first use to keep application startup fast
+cv2 = lazy_import("cv2")
+
+
+class FrameDeduplicator:
+    """
+    Collapses near-duplicate video frames using a perceptual difference hash
+    (dHash) so the image budget sent to Claude goes to visually distinct frames.
+    """
+
+    def __init__(self, hash_size: int = 8, max_distance: int = 6):
+        # Frames whose hashes differ in at most max_distance bits are duplicates
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+
+    def select(self, frames: List[str], budget: int) -> Tuple[List[str], Dict]:
+        """
+        Pick up to `budget` visually distinct frames, in their original order.
+
+        Returns:
+            Tuple of (selected base64 frames, selection stats including the
+            estimated image tokens saved versus sending the first `budget` frames)
+        """
+        if not frames:
+            return [], self._stats(0, 0, 0, 0, 0)
+
+        images = [self._decode(frame) for frame in frames]
+        hashes = [self._dhash(image) for image in images]
+        tokens = [self._image_tokens(image) for image in images]
+
+        # Greedy farthest-point selection: start from the opening frame and keep
+        # adding the frame least similar to everything chosen so far
+        selected = [0]
+        min_distance = [self._hamming(hashes[0], h) for h in hashes]
+        while len(selected) < budget:
+            candidate = int(np.argmax(min_distance))
+            if min_distance[candidate] <= self.max_distance:
+                break
+            selected.append(candidate)
+            min_distance = [
+                min(current, self._hamming(hashes[candidate], h))
+                for current, h in zip(min_distance, hashes)
+            ]
+
+        distinct = self._count_distinct(hashes)
+        selected.sort()
+
+        baseline_tokens = sum(tokens[:budget])
+        sent_tokens = sum(tokens[i] for i in selected)
+
+        return (
+            [frames[i] for i in selected],
+            self._stats(len(frames), distinct, len(selected), sent_tokens, baseline_tokens - sent_tokens)
+        )
+
+    def _decode(self, frame_b64: str) -> np.ndarray:
+        buffer = np.frombuffer(base64.b64decode(frame_b64), dtype=np.uint8)
+        return cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+
+    def _dhash(self, image: np.ndarray) -> int:
+        """
+        Difference hash: compare neighbouring pixels of a tiny grayscale thumbnail.
+        """
+        small = cv2.resize(image, (self.hash_size + 1, self.hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int("".join("1" if bit else "0" for bit in bits), 2)
+
+    def _hamming(self, a: int, b: int) -> int:
+        return bin(a ^ b).count("1")
+
+    def _count_distinct(self, hashes: List[int]) -> int:
+        """
+        Number of frames left after collapsing runs of near-duplicates.
+        """
+        kept: List[int] = []
+        for h in hashes:
+            if all(self._hamming(h, k) > self.max_distance for k in kept):
+                kept.append(h)
+        return len(kept)
+
+    def _image_tokens(self, image: np.ndarray) -> int:
+        """
+        Anthropic's estimate for image input cost: width * height / 750 tokens.
+        """
+        height, width = image.shape[:2]
+        return int(round(width * height / 750))
+
+    def _stats(self, extracted: int, distinct: int, sent: int, sent_tokens: int, saved_tokens: int) -> Dict:
+        return {
+            "frames_extracted": extracted,
+            "distinct_frames": distinct,
+            "frames_sent": sent,
+            "image_tokens_sent": sent_tokens,
+            "image_tokens_saved": saved_tokens
+        }
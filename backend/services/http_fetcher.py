@@ -0,0 +1,230 @@
+"""
+HTTP Fetcher Service
+
+Shared async HTTP subsystem for outbound web and patent lookups:
+- One pooled keep-alive client per upstream host
+- An async token-bucket rate limiter per host, so independent requests can
+  be issued concurrently while each upstream still sees a bounded rate
+- Clients for the least recently used idle hosts are closed once more than
+  max_hosts are open (page enrichment touches many one-off hosts); hosts
+  with requests in flight are never evicted
+- httpx is imported on first use, keeping application startup fast
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, holding at most `burst`.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._tokens = 1
+                self._updated = time.monotonic()
+
+            self._tokens -= 1
+
+    def is_full(self) -> bool:
+        """
+        Whether the bucket has refilled completely, i.e. holds no rate state.
+        """
+        if self._lock.locked():
+            return False
+        return self._tokens + (time.monotonic() - self._updated) * self.rate >= self.burst
+
+
+class HttpFetcher:
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_connections_per_host: Optional[int] = None,
+        timeout: Optional[float] = None,
+        host_rate_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_hosts: Optional[int] = None
+    ):
+        self.rate = rate or float(os.getenv("HTTP_RATE_PER_SECOND", "1"))
+        self.burst = burst or float(os.getenv("HTTP_RATE_BURST", "3"))
+        self.max_connections_per_host = max_connections_per_host or int(
+            os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "4")
+        )
+        self.timeout = timeout or float(os.getenv("HTTP_TIMEOUT", "10"))
+        # Per-host (rate, burst) overrides
+        self.host_rate_limits = host_rate_limits or {}
+        self.max_hosts = max_hosts or int(os.getenv("HTTP_MAX_HOSTS", "64"))
+
+        self._clients: "OrderedDict[str, Any]" = OrderedDict()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._requests: Dict[str, int] = {}
+        # Requests currently using each host's client
+        self._in_use: Dict[str, int] = {}
+        self._closing: Set[asyncio.Task] = set()
+
+    async def get(self, url: str, **kwargs) -> Any:
+        """
+        GET a URL through its host's pool once the host's rate limiter allows.
+        Accepts the same keyword arguments as httpx.AsyncClient.get.
+
+        Raises:
+            httpx.HTTPError on network errors and error status codes
+        """
+        host = urlsplit(url).netloc
+        await self._bucket(host).acquire()
+
+        self._requests[host] = self._requests.get(host, 0) + 1
+        async with self._using(host) as client:
+            response = await client.get(url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def get_text(
+        self,
+        url: str,
+        max_bytes: int,
+        check_url: Optional[Callable[[str], Awaitable[None]]] = None,
+        max_redirects: int = 5
+    ) -> str:
+        """
+        GET a text/HTML page, reading at most max_bytes of the body.
+
+        Redirects are followed here, one hop at a time, so that check_url
+        (which raises ValueError to refuse a URL) vets the first URL and
+        every redirect target before it is requested.
+
+        Raises:
+            httpx.HTTPError on network errors and error status codes
+            ValueError if the response is not text, a URL is refused or
+            there are too many redirects
+        """
+        for _ in range(max_redirects + 1):
+            if check_url:
+                await check_url(url)
+
+            host = urlsplit(url).netloc
+            await self._bucket(host).acquire()
+
+            self._requests[host] = self._requests.get(host, 0) + 1
+            async with self._using(host) as client, client.stream("GET", url, follow_redirects=False) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "")
+                if content_type and not content_type.startswith(("text/", "application/xhtml")):
+                    raise ValueError(f"Not a text page ({content_type})")
+
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) >= max_bytes:
+                        break
+                return bytes(body[:max_bytes]).decode(response.encoding or "utf-8", errors="replace")
+
+        raise ValueError(f"Too many redirects fetching {url}")
+
+    def _bucket(self, host: str) -> TokenBucket:
+        if host not in self._buckets:
+            rate, burst = self.host_rate_limits.get(host, (self.rate, self.burst))
+            self._buckets[host] = TokenBucket(rate, burst)
+        return self._buckets[host]
+
+    @asynccontextmanager
+    async def _using(self, host: str) -> AsyncIterator[Any]:
+        """
+        The host's client, marked in use so it is not evicted meanwhile.
+        """
+        self._in_use[host] = self._in_use.get(host, 0) + 1
+        try:
+            yield self._client(host)
+        finally:
+            self._in_use[host] -= 1
+            if not self._in_use[host]:
+                del self._in_use[host]
+
+    def _client(self, host: str) -> Any:
+        if host in self._clients:
+            self._clients.move_to_end(host)
+        else:
+            import httpx
+
+            self._evict_idle_hosts()
+            self._clients[host] = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections_per_host,
+                    max_keepalive_connections=self.max_connections_per_host
+                ),
+                timeout=self.timeout,
+                follow_redirects=True
+            )
+        return self._clients[host]
+
+    def _evict_idle_hosts(self):
+        """
+        Close least recently used clients with no requests in flight until
+        there is room for one more. If every host is busy the limit is
+        exceeded until some finish.
+        """
+        excess = len(self._clients) - self.max_hosts + 1
+        if excess <= 0:
+            return
+
+        idle_hosts = [host for host in self._clients if host not in self._in_use]
+        for host in idle_hosts[:excess]:
+            client = self._clients.pop(host)
+            self._requests.pop(host, None)
+            task = asyncio.create_task(client.aclose())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+        # Buckets of hosts without a client are dropped once they have
+        # refilled; one still refilling carries the host's rate limit
+        for host in [host for host in self._buckets if host not in self._clients]:
+            if self._buckets[host].is_full():
+                del self._buckets[host]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            host: {
+                "requests": self._requests.get(host, 0),
+                "rate_limited_seconds": round(bucket.waited, 3)
+            }
+            for host, bucket in self._buckets.items()
+        }
+
+    async def close(self):
+        """
+        Close pooled connections on application shutdown.
+        """
+        await asyncio.gather(*(client.aclose() for client in self._clients.values()), *self._closing)
+        self._clients.clear()
@@ -1,9 +1,14 @@
-import requests
+import asyncio
+import numpy as np
 import re
 import time
-from typing import List, Dict, Tuple, Optional
-from anthropic import Anthropic
+from typing import Any, Awaitable, List, Dict, Tuple, Optional
 import os
+from urllib.parse import quote_plus
+from services.http_fetcher import HttpFetcher
+from services.llm_client import LLMClient, UsageTracker, prefix_block
+from services.patent_embeddings import PatentEmbeddings
+from services.patent_index import PatentIndex
 
 
 class IdeaAnalyzer:
@@ -12,8 +17,19 @@ class IdeaAnalyzer:
     Generates a quantitative score (0-100) and provides relevant U.S. patents.
     """
 
-    def __init__(self, anthropic_api_key: str):
-        self.client = Anthropic(api_key=anthropic_api_key)
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        http_fetcher: HttpFetcher,
+        patent_index: Optional[PatentIndex] = None,
+        patent_embeddings: Optional[PatentEmbeddings] = None
+    ):
+        self.llm_client = llm_client
+        self.http_fetcher = http_fetcher
+        # Local patent corpus; the web scraper is only used when it is empty
+        self.patent_index = patent_index
+        # Semantic similarity for patent risk; count bands are used without it
+        self.patent_embeddings = patent_embeddings
         self.model = "claude-sonnet-4-20250514"
 
         # Scoring weights (must sum to 100%)
@@ -26,11 +42,18 @@ class IdeaAnalyzer:
             'ethical_regulatory': 0.05  # 5%
         }
 
+        # Patents at or above this cosine similarity count as closely related
+        self.close_patent_similarity = float(os.getenv("PATENT_CLOSE_SIMILARITY", "0.6"))
+
+        # Upper bound (seconds) on any single factor evaluation
+        self.factor_timeout = float(os.getenv("IDEA_FACTOR_TIMEOUT", "60"))
+
     async def analyze_idea(
         self,
         idea_description: str,
         keywords: Optional[List[str]] = None,
-        industry: Optional[str] = None
+        industry: Optional[str] = None,
+        use_cache: bool = True
     ) -> Dict:
         """
         Main analysis function that coordinates all evaluation steps.
@@ -39,39 +62,69 @@ class IdeaAnalyzer:
             idea_description: Detailed description of the startup idea
             keywords: Optional list of relevant keywords
             industry: Optional industry/domain tag
+            use_cache: Set False to bypass the LLM response cache
 
         Returns:
             Dictionary containing scores, explanations, and patent information
         """
-        # Step 1: Analyze novelty and originality
-        novelty_score, novelty_explanation = await self.analyze_novelty(
-            idea_description, keywords, industry
-        )
+        start = time.perf_counter()
+        usage = UsageTracker()
+        shared = {'keywords': keywords, 'industry': industry, 'usage': usage}
+
+        # Steps 1-6: every factor is independent of the others (only patent
+        # risk needs the patent search), so fan them out concurrently. They
+        # share one idea context (see _idea_context); a long one is marked
+        # for the prompt cache so later analyses of the idea can read it.
+        factors = {
+            'novelty': self._timed(self.analyze_novelty(
+                idea_description, keywords, industry, use_cache, usage=usage
+            )),
+            'technical_feasibility': self._timed(self.analyze_technical_feasibility(
+                idea_description, use_cache, **shared
+            )),
+            'market_overlap': self._timed(self.analyze_market_overlap(
+                idea_description, keywords, industry, use_cache, usage=usage
+            )),
+            'patent_search': self._timed(self.search_patents(
+                idea_description, keywords, use_cache,
+                industry=industry, usage=usage
+            )),
+            'implementation_complexity': self._timed(self.analyze_implementation_complexity(
+                idea_description, use_cache, **shared
+            )),
+            'ethical_regulatory': self._timed(self.analyze_ethical_regulatory(
+                idea_description, industry, use_cache, keywords=keywords, usage=usage
+            ))
+        }
+        outcomes = await asyncio.gather(*factors.values())
+        results = dict(zip(factors.keys(), outcomes))
 
-        # Step 2: Analyze technical feasibility
-        feasibility_score, feasibility_explanation = await self.analyze_technical_feasibility(
-            idea_description
-        )
+        timings = {name: elapsed for name, (_, elapsed) in results.items()}
 
-        # Step 3: Analyze market overlap
-        market_score, market_explanation = await self.analyze_market_overlap(
-            idea_description, keywords, industry
+        novelty_score, novelty_explanation = self._factor_result(results['novelty'], "novelty")
+        feasibility_score, feasibility_explanation = self._factor_result(
+            results['technical_feasibility'], "technical feasibility"
         )
-
-        # Step 4: Search patents and assess patent risk
-        patents = await self.search_patents(idea_description, keywords)
-        patent_score, patent_explanation = self.assess_patent_risk(patents, idea_description)
-
-        # Step 5: Assess implementation complexity
-        complexity_score, complexity_explanation = await self.analyze_implementation_complexity(
-            idea_description
+        market_score, market_explanation = self._factor_result(results['market_overlap'], "market overlap")
+        complexity_score, complexity_explanation = self._factor_result(
+            results['implementation_complexity'], "implementation complexity"
         )
-
-        # Step 6: Evaluate ethical and regulatory concerns
-        ethical_score, ethical_explanation = await self.analyze_ethical_regulatory(
-            idea_description, industry
+        ethical_score, ethical_explanation = self._factor_result(
+            results['ethical_regulatory'], "ethical/regulatory concerns"
         )
 
+        # A failed or timed-out search says nothing about patent freedom
+        patents = results['patent_search'][0]
+        if patents is None:
+            patents = []
+            patent_score, patent_explanation = 5.0, "Unable to search patents at this time."
+        else:
+            patent_score, patent_explanation = await asyncio.to_thread(
+                self.assess_patent_risk, patents, idea_description
+            )
+
+        timings['total'] = round(time.perf_counter() - start, 3)
+
         # Step 7: Compute weighted total score
         scores = {
             'novelty': novelty_score,
@@ -96,30 +149,81 @@ class IdeaAnalyzer:
                 'implementation_complexity': complexity_explanation,
                 'ethical_regulatory': ethical_explanation
             },
-            'patents': patents[:10]  # Top 10 most relevant patents
+            'patents': patents[:10],  # Top 10 most relevant patents
+            'timings': timings,
+            'llm_usage': usage.as_dict()
         }
 
         return result
 
-    async def analyze_novelty(
+    async def _timed(self, coro: Awaitable[Any]) -> Tuple[Any, float]:
+        """
+        Await a single factor evaluation under the per-factor timeout.
+
+        Returns:
+            Tuple of (result or None if it timed out, elapsed seconds)
+        """
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coro, timeout=self.factor_timeout)
+        except asyncio.TimeoutError:
+            print(f"Factor evaluation timed out after {self.factor_timeout}s")
+            result = None
+        return result, round(time.perf_counter() - start, 3)
+
+    def _factor_result(self, outcome: Tuple[Any, float], label: str) -> Tuple[float, str]:
+        """
+        Unpack a timed factor outcome, substituting the neutral fallback on timeout.
+        """
+        result, _ = outcome
+        if result is None:
+            return 5.0, f"Unable to analyze {label} at this time."
+        return result
+
+    def _idea_context(
         self,
         idea_description: str,
         keywords: Optional[List[str]],
         industry: Optional[str]
-    ) -> Tuple[float, str]:
+    ) -> List[Dict[str, Any]]:
         """
-        Analyze the novelty and originality of the idea using Claude AI.
-
-        Returns:
-            Tuple of (score 0-10, explanation)
+        System prompt shared by every evaluation of one idea, ending in a
+        prompt-cache breakpoint when it is long enough to be cached. Factor
+        prompts only carry their own criteria.
         """
-        prompt = f"""Analyze the novelty and originality of this startup idea on a scale of 0-10:
+        return [prefix_block(self._idea_context_text(idea_description, keywords, industry))]
+
+    @staticmethod
+    def _idea_context_text(
+        idea_description: str,
+        keywords: Optional[List[str]],
+        industry: Optional[str]
+    ) -> str:
+        context = f"""You are evaluating a startup idea. Each request asks about one aspect of it.
 
 **Idea Description:**
 {idea_description}
 
 {"**Keywords:** " + ", ".join(keywords) if keywords else ""}
-{"**Industry:** " + industry if industry else ""}
+{"**Industry:** " + industry if industry else ""}"""
+        return context.strip()
+
+    async def analyze_novelty(
+        self,
+        idea_description: str,
+        keywords: Optional[List[str]],
+        industry: Optional[str],
+        use_cache: bool = True,
+        *,
+        usage: Optional[UsageTracker] = None
+    ) -> Tuple[float, str]:
+        """
+        Analyze the novelty and originality of the idea using Claude AI.
+
+        Returns:
+            Tuple of (score 0-10, explanation)
+        """
+        prompt = f"""Analyze the novelty and originality of the startup idea on a scale of 0-10:
 
 **Evaluation Criteria:**
 - How unique is this solution compared to existing approaches?
@@ -134,8 +238,11 @@ Provide ONLY a JSON object with this exact format:
 Be critical but fair. A score of 10 means groundbreaking innovation, 5 means moderate novelty, 0 means completely derivative."""
 
         try:
-            message = self.client.messages.create(
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
                 model=self.model,
+                system=self._idea_context(idea_description, keywords, industry),
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -149,18 +256,22 @@ Be critical but fair. A score of 10 means groundbreaking innovation, 5 means mod
             print(f"Novelty analysis error: {e}")
             return 5.0, "Unable to analyze novelty at this time."
 
-    async def analyze_technical_feasibility(self, idea_description: str) -> Tuple[float, str]:
+    async def analyze_technical_feasibility(
+        self,
+        idea_description: str,
+        use_cache: bool = True,
+        *,
+        keywords: Optional[List[str]] = None,
+        industry: Optional[str] = None,
+        usage: Optional[UsageTracker] = None
+    ) -> Tuple[float, str]:
         """
         Analyze technical feasibility of the idea.
 
         Returns:
             Tuple of (score 0-10, explanation)
         """
-        prompt = f"""Evaluate the technical feasibility of this startup idea on a scale of 0-10:
-
-**Idea Description:**
-{idea_description}
-
+        prompt = f"""Evaluate the technical feasibility of the startup idea on a scale of 0-10:
 **Evaluation Criteria:**
 - Is the required technology currently available or achievable?
 - What are the technical challenges and risks?
@@ -175,8 +286,11 @@ Provide ONLY a JSON object with this exact format:
 A score of 10 means highly feasible with current technology, 5 means challenging but possible, 0 means technically infeasible."""
 
         try:
-            message = self.client.messages.create(
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
                 model=self.model,
+                system=self._idea_context(idea_description, keywords, industry),
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -194,7 +308,10 @@ A score of 10 means highly feasible with current technology, 5 means challenging
         self,
         idea_description: str,
         keywords: Optional[List[str]],
-        industry: Optional[str]
+        industry: Optional[str],
+        use_cache: bool = True,
+        *,
+        usage: Optional[UsageTracker] = None
     ) -> Tuple[float, str]:
         """
         Analyze market overlap with existing products/services.
@@ -203,13 +320,7 @@ A score of 10 means highly feasible with current technology, 5 means challenging
         Returns:
             Tuple of (score 0-10, explanation)
         """
-        prompt = f"""Analyze the market overlap and competitive landscape for this startup idea on a scale of 0-10:
-
-**Idea Description:**
-{idea_description}
-
-{"**Keywords:** " + ", ".join(keywords) if keywords else ""}
-{"**Industry:** " + industry if industry else ""}
+        prompt = f"""Analyze the market overlap and competitive landscape for the startup idea on a scale of 0-10:
 
 **Evaluation Criteria:**
 - How crowded is this market space?
@@ -227,8 +338,11 @@ Provide ONLY a JSON object with this exact format:
 {{"score": <number between 0-10>, "explanation": "<2-3 sentence explanation>"}}"""
 
         try:
-            message = self.client.messages.create(
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
                 model=self.model,
+                system=self._idea_context(idea_description, keywords, industry),
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -245,25 +359,41 @@ Provide ONLY a JSON object with this exact format:
     async def search_patents(
         self,
         idea_description: str,
-        keywords: Optional[List[str]] = None
-    ) -> List[Dict]:
+        keywords: Optional[List[str]] = None,
+        use_cache: bool = True,
+        *,
+        industry: Optional[str] = None,
+        usage: Optional[UsageTracker] = None
+    ) -> Optional[List[Dict]]:
         """
-        Search for relevant U.S. patents using Google Patents API/scraping.
+        Search for relevant U.S. patents in the local patent index, falling
+        back to Google Patents scraping when no index has been ingested.
 
         Returns:
-            List of patent dictionaries with details
+            List of patent dictionaries with details, or None if the search failed
         """
         patents = []
 
         try:
             # Extract key technical terms from description using Claude
-            search_terms = await self._extract_patent_search_terms(idea_description, keywords)
+            search_terms = await self._extract_patent_search_terms(
+                idea_description, keywords, use_cache, industry=industry, usage=usage
+            )
 
-            # Search Google Patents (using basic web scraping approach)
-            for term in search_terms[:3]:  # Search top 3 terms
-                time.sleep(1)  # Rate limiting
-                found_patents = self._scrape_google_patents(term)
-                patents.extend(found_patents)
+            if self.patent_index and await asyncio.to_thread(self.patent_index.is_available):
+                # One BM25 query over the idea and its search terms
+                query = " ".join([idea_description, *search_terms, *(keywords or [])])
+                return await asyncio.to_thread(self.patent_index.search, query, 15)
+
+            # Search Google Patents (using basic web scraping approach). Terms
+            # are fetched concurrently; the fetcher's per-host rate limiter paces them
+            found = await asyncio.gather(*(
+                self._scrape_google_patents(term) for term in search_terms[:3]  # Search top 3 terms
+            ))
+            if found and all(found_patents is None for found_patents in found):
+                return None
+            for found_patents in found:
+                patents.extend(found_patents or [])
 
             # Remove duplicates based on patent number
             seen = set()
@@ -277,24 +407,20 @@ Provide ONLY a JSON object with this exact format:
 
         except Exception as e:
             print(f"Patent search error: {e}")
-            return []
+            return None
 
-    def _scrape_google_patents(self, search_term: str) -> List[Dict]:
+    async def _scrape_google_patents(self, search_term: str) -> Optional[List[Dict]]:
         """
-        Scrape Google Patents for a search term.
+        Scrape Google Patents for a search term; None if the request failed.
         Note: This is a simplified version. In production, use official USPTO API.
         """
         patents = []
 
         try:
             # Google Patents search URL
-            search_url = f"https://patents.google.com/?q={search_term.replace(' ', '+')}&country=US&type=PATENT"
+            search_url = f"https://patents.google.com/?q={quote_plus(search_term)}&country=US&type=PATENT"
 
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-
-            response = requests.get(search_url, headers=headers, timeout=10)
+            response = await self.http_fetcher.get(search_url)
 
             if response.status_code == 200:
                 # This is a simplified parser - in production, use proper HTML parsing
@@ -312,23 +438,23 @@ Provide ONLY a JSON object with this exact format:
 
         except Exception as e:
             print(f"Google Patents scraping error for '{search_term}': {e}")
+            return None
 
         return patents
 
     async def _extract_patent_search_terms(
         self,
         idea_description: str,
-        keywords: Optional[List[str]]
+        keywords: Optional[List[str]],
+        use_cache: bool = True,
+        *,
+        industry: Optional[str] = None,
+        usage: Optional[UsageTracker] = None
     ) -> List[str]:
         """
         Use Claude to extract relevant patent search terms from the idea description.
         """
-        prompt = f"""Extract 3-5 specific technical search terms for finding relevant patents for this idea:
-
-**Idea Description:**
-{idea_description}
-
-{"**Keywords:** " + ", ".join(keywords) if keywords else ""}
+        prompt = f"""Extract 3-5 specific technical search terms for finding relevant patents for the startup idea:
 
 **Instructions:**
 - Focus on technical, specific terminology
@@ -341,8 +467,11 @@ Provide ONLY a JSON array of strings:
 ["term1", "term2", "term3"]"""
 
         try:
-            message = self.client.messages.create(
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
                 model=self.model,
+                system=self._idea_context(idea_description, keywords, industry),
                 max_tokens=500,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -362,12 +491,23 @@ Provide ONLY a JSON array of strings:
         Assess patent freedom/risk based on found patents.
         Higher score = lower risk (better patent freedom)
 
+        With patent embeddings available, the score comes from how similar
+        the closest patents are to the idea; each patent gets a 'similarity'
+        and the list is re-sorted closest first. Otherwise it falls back to
+        the number of patents found.
+
         Returns:
             Tuple of (score 0-10, explanation)
         """
         if len(patents) == 0:
             return 9.0, "No closely related patents found, suggesting strong patent freedom."
 
+        if self.patent_embeddings and self.patent_embeddings.is_available():
+            try:
+                return self._assess_patent_similarity(patents, idea_description)
+            except Exception as e:
+                print(f"Patent similarity error: {e}")
+
         if len(patents) >= 10:
             score = 4.0
             explanation = f"Found {len(patents)} related patents, indicating a crowded patent landscape. Careful freedom-to-operate analysis recommended."
@@ -380,9 +520,46 @@ Provide ONLY a JSON array of strings:
 
         return score, explanation
 
+    def _assess_patent_similarity(self, patents: List[Dict], idea_description: str) -> Tuple[float, str]:
+        similarities = self.patent_embeddings.similarities(idea_description, patents)
+
+        for patent, similarity in zip(patents, similarities):
+            patent['similarity'] = round(float(similarity), 3)
+        patents.sort(key=lambda patent: patent['similarity'], reverse=True)
+
+        # Overlap is dominated by the closest patent, tempered by the next few
+        ranked = np.sort(similarities)[::-1]
+        top = float(ranked[0])
+        overlap = 0.6 * top + 0.4 * float(ranked[:3].mean())
+        close_count = int((similarities >= self.close_patent_similarity).sum())
+
+        # Map overlap between the low and high similarity marks onto 9.5 .. 1.0
+        low, high = 0.35, 0.85
+        fraction = min(max((overlap - low) / (high - low), 0.0), 1.0)
+        score = round(9.5 - 8.5 * fraction, 1)
+
+        if fraction >= 0.7:
+            assessment = "The closest patents are very similar to this idea; a freedom-to-operate analysis is strongly recommended."
+        elif fraction >= 0.4:
+            assessment = "Some patents overlap meaningfully with this idea; a differentiation strategy is needed."
+        else:
+            assessment = "The related patents are only loosely similar, suggesting a relatively clear landscape."
+
+        explanation = (
+            f"Closest patent similarity {top:.2f} ({patents[0]['patent_number']}); "
+            f"{close_count} of {len(patents)} patents are closely related "
+            f"(similarity >= {self.close_patent_similarity:.2f}). {assessment}"
+        )
+        return score, explanation
+
     async def analyze_implementation_complexity(
         self,
-        idea_description: str
+        idea_description: str,
+        use_cache: bool = True,
+        *,
+        keywords: Optional[List[str]] = None,
+        industry: Optional[str] = None,
+        usage: Optional[UsageTracker] = None
     ) -> Tuple[float, str]:
         """
         Analyze MVP implementation complexity.
@@ -391,11 +568,7 @@ Provide ONLY a JSON array of strings:
         Returns:
             Tuple of (score 0-10, explanation)
         """
-        prompt = f"""Evaluate the MVP implementation complexity for this startup idea on a scale of 0-10:
-
-**Idea Description:**
-{idea_description}
-
+        prompt = f"""Evaluate the MVP implementation complexity for the startup idea on a scale of 0-10:
 **Evaluation Criteria:**
 - How quickly can a minimum viable product be built?
 - What technical resources are required?
@@ -412,8 +585,11 @@ Provide ONLY a JSON object with this exact format:
 {{"score": <number between 0-10>, "explanation": "<2-3 sentence explanation>"}}"""
 
         try:
-            message = self.client.messages.create(
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
                 model=self.model,
+                system=self._idea_context(idea_description, keywords, industry),
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -430,7 +606,11 @@ Provide ONLY a JSON object with this exact format:
     async def analyze_ethical_regulatory(
         self,
         idea_description: str,
-        industry: Optional[str]
+        industry: Optional[str],
+        use_cache: bool = True,
+        *,
+        keywords: Optional[List[str]] = None,
+        usage: Optional[UsageTracker] = None
     ) -> Tuple[float, str]:
         """
         Analyze ethical and regulatory concerns.
@@ -439,12 +619,7 @@ Provide ONLY a JSON object with this exact format:
         Returns:
             Tuple of (score 0-10, explanation)
         """
-        prompt = f"""Evaluate ethical and regulatory concerns for this startup idea on a scale of 0-10:
-
-**Idea Description:**
-{idea_description}
-
-{"**Industry:** " + industry if industry else ""}
+        prompt = f"""Evaluate ethical and regulatory concerns for the startup idea on a scale of 0-10:
 
 **Evaluation Criteria:**
 - Privacy and data protection concerns
@@ -462,8 +637,11 @@ Provide ONLY a JSON object with this exact format:
 {{"score": <number between 0-10>, "explanation": "<2-3 sentence explanation>"}}"""
 
         try:
-            message = self.client.messages.create(
+            message = await self.llm_client.create_message(
+                use_cache=use_cache,
+                usage=usage,
                 model=self.model,
+                system=self._idea_context(idea_description, keywords, industry),
                 max_tokens=1000,
                 messages=[{"role": "user", "content": prompt}]
             )
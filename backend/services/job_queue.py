@@ -0,0 +1,265 @@
+"""
+Job Queue Service
+
+Background job subsystem for long-running analyses:
+- submit() records a job and returns its id immediately
+- A bounded pool of asyncio workers runs the job handler
+- Job state, per-stage progress and results live in SQLite, so finished
+  results survive a restart and unfinished jobs are picked up again
+- Finished jobs are purged once older than the retention period
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobStore:
+    """
+    SQLite-backed job records. Thread-safe so it can be called from asyncio.to_thread.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+            "stages TEXT NOT NULL, params TEXT NOT NULL, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def create(self, job_id: str, kind: str, params: Dict[str, Any], stages: Dict[str, str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, stages, params, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(stages), json.dumps(params), now, now)
+            )
+            self._conn.commit()
+
+    def update(self, job_id: str, **fields):
+        """
+        Update status, stages, result and/or error for a job.
+        """
+        columns = []
+        values = []
+        for name, value in fields.items():
+            if name in ("stages", "result"):
+                value = json.dumps(value)
+            columns.append(f"{name} = ?")
+            values.append(value)
+        columns.append("updated_at = ?")
+        values.append(time.time())
+
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(columns)} WHERE id = ?", (*values, job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """
+        Jobs that were queued or running, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def purge_finished(self, max_age: float) -> int:
+        """
+        Delete completed/failed jobs last updated over max_age seconds ago.
+        Returns number removed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (time.time() - max_age,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["stages"] = json.loads(job["stages"])
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[str, Dict[str, Any], "JobProgress"], Awaitable[Dict[str, Any]]],
+        stages: List[str],
+        max_workers: int = 2,
+        max_queued: int = 100,
+        on_finished: Optional[Callable[[Dict[str, Any]], None]] = None,
+        retention: float = 7 * 86400
+    ):
+        self.store = store
+        self.handler = handler
+        self.stages = stages
+        self.max_workers = max_workers
+        self.on_finished = on_finished
+        # Seconds finished jobs are kept; purged at most once per purge_interval
+        self.retention = retention
+        self.purge_interval = min(retention, 3600)
+        self._last_purge = 0.0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._workers: List[asyncio.Task] = []
+        # Queue slots held by submits whose job row is still being written
+        self._reserved = 0
+
+    async def start(self):
+        """
+        Start the worker pool and re-enqueue jobs left unfinished by a restart.
+        """
+        await self._purge_finished()
+        for job in await asyncio.to_thread(self.store.unfinished):
+            if self._queue.full():
+                await asyncio.to_thread(
+                    self.store.update, job["id"], status="failed", error="Job queue full after restart"
+                )
+                continue
+
+            await asyncio.to_thread(
+                self.store.update, job["id"], status="queued",
+                stages={name: "done" if state == "done" else "pending" for name, state in job["stages"].items()}
+            )
+            self._queue.put_nowait(job["id"])
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, kind: str, params: Dict[str, Any], completed_stages: List[str] = ()) -> str:
+        """
+        Record a job and queue it. Raises QueueFullError when at capacity.
+        """
+        # Take the slot before the store write so concurrent submits cannot
+        # both pass the check and overflow the queue afterwards
+        if self._queue.qsize() + self._reserved >= self._queue.maxsize:
+            raise QueueFullError("Too many jobs queued, please retry later")
+        self._reserved += 1
+
+        try:
+            job_id = uuid.uuid4().hex
+            stages = {name: "done" if name in completed_stages else "pending" for name in self.stages}
+            await asyncio.to_thread(self.store.create, job_id, kind, params, stages)
+        finally:
+            self._reserved -= 1
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "max_workers": self.max_workers
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # Errors outside the handler (store, callbacks) must not stop the worker
+                print(f"Job {job_id} error: {e}")
+                try:
+                    await asyncio.to_thread(self.store.update, job_id, status="failed", error=str(e))
+                except Exception as update_error:
+                    print(f"Could not mark job {job_id} failed: {update_error}")
+            finally:
+                self._queue.task_done()
+
+            if time.monotonic() - self._last_purge >= self.purge_interval:
+                await self._purge_finished()
+
+    async def _purge_finished(self):
+        self._last_purge = time.monotonic()
+        try:
+            removed = await asyncio.to_thread(self.store.purge_finished, self.retention)
+            if removed:
+                print(f"Purged {removed} finished jobs")
+        except Exception as e:
+            print(f"Job purge failed: {e}")
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return
+
+        await asyncio.to_thread(self.store.update, job_id, status="running")
+        progress = JobProgress(self.store, job_id, job["stages"])
+
+        # A cancelled job (shutdown) is left as running so start() picks it up again
+        try:
+            result = await self.handler(job_id, job["params"], progress)
+            await asyncio.to_thread(self.store.update, job_id, status="completed", result=result)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            await progress.fail_running()
+            await asyncio.to_thread(self.store.update, job_id, status="failed", error=str(e))
+
+        if self.on_finished:
+            try:
+                self.on_finished(job)
+            except Exception as e:
+                print(f"Job {job_id} cleanup failed: {e}")
+
+
+class JobProgress:
+    """
+    Per-stage progress reporter handed to job handlers.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, stages: Dict[str, str]):
+        self.store = store
+        self.job_id = job_id
+        self.stages = dict(stages)
+
+    async def start(self, *names: str):
+        await self._set(names, "running")
+
+    async def done(self, *names: str):
+        await self._set(names, "done")
+
+    async def fail_running(self):
+        await self._set([name for name, state in self.stages.items() if state == "running"], "failed")
+
+    async def _set(self, names, state: str):
+        for name in names:
+            self.stages[name] = state
+        await asyncio.to_thread(self.store.update, self.job_id, stages=self.stages)
@@ -0,0 +1,31 @@
+import importlib
+import sys
+from typing import Any
+
+
+class LazyModule:
+    """
+    Stand-in for a heavy module (cv2, anthropic, ...) that is only imported
+    the first time one of its attributes is used, keeping application
+    import time low.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    """
+    Whether a module has actually been imported yet (by anyone).
+    """
+    return name in sys.modules
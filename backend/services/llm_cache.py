@@ -0,0 +1,176 @@
+"""
+LLM Response Cache
+
+Content-addressed cache for Claude responses, keyed by a hash of the
+request (model, system, messages, max_tokens):
+- In-memory LRU front with a size limit and TTL
+- Optional SQLite tier that survives restarts
+- Hit/miss counters for diagnostics
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+class DiskCache:
+    """
+    Small SQLite key/value store holding JSON values with their creation time.
+    Thread-safe so it can be called from asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """
+        Return (value, created_at) or None if missing or older than ttl seconds.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if ttl is not None and time.time() - created_at > ttl:
+            self.delete(key)
+            return None
+        return json.loads(value), created_at
+
+    def set(self, key: str, value: Any, created_at: Optional[float] = None):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created_at or time.time())
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge_expired(self, ttl: float) -> int:
+        """
+        Delete entries older than ttl seconds. Returns number removed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - ttl,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _without_cache_control(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _without_cache_control(v) for k, v in value.items() if k != "cache_control"}
+    if isinstance(value, list):
+        return [_without_cache_control(v) for v in value]
+    return value
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 86400,
+        disk_path: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (response dict, created_at)
+        self._memory: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self.disk = DiskCache(disk_path, table="llm_responses") if disk_path else None
+        if self.disk:
+            self.disk.purge_expired(ttl)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(**request) -> str:
+        """
+        Hash the parts of a messages.create request that determine the output.
+        Prompt-cache breakpoints do not change the output and are left out.
+        """
+        payload = {
+            "model": request.get("model"),
+            "system": _without_cache_control(request.get("system")),
+            "messages": _without_cache_control(request.get("messages")),
+            "max_tokens": request.get("max_tokens")
+        }
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if time.time() - created_at <= self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+
+        if self.disk:
+            stored = await asyncio.to_thread(self.disk.get, key, self.ttl)
+            if stored is not None:
+                value, created_at = stored
+                self._remember(key, value, created_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict):
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        if self.disk:
+            await asyncio.to_thread(self.disk.set, key, value, created_at)
+
+    def _remember(self, key: str, value: Dict, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_enabled": self.disk is not None
+        }
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
@@ -0,0 +1,248 @@
+"""
+Shared LLM Client Service
+
+Single async Anthropic client shared by every analyzer:
+- Pooled keep-alive HTTP connections (one pool per process)
+- Global cap on in-flight Claude calls so a worker can serve many
+  concurrent analyses without overrunning rate limits
+- Optional content-addressed response cache (see llm_cache.py)
+- Helpers for Anthropic prompt caching: shared prompt prefixes long enough
+  to be cached are marked with cache_control breakpoints, and cache
+  read/write tokens are tracked
+- The Anthropic SDK is imported and the client built on first use (or by
+  warm_up), keeping application startup fast
+"""
+
+import asyncio
+import importlib
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+from services.llm_cache import LLMResponseCache
+
+
+# The API ignores breakpoints on shorter prefixes (1024 tokens for Sonnet)
+MIN_CACHEABLE_TOKENS = 1024
+
+# Rough size of one token in characters, for estimating prefix length
+CHARS_PER_TOKEN = 4
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def is_cacheable(text: str) -> bool:
+    """
+    Whether a text prefix is (roughly) long enough for the prompt cache.
+    """
+    return len(text) // CHARS_PER_TOKEN >= MIN_CACHEABLE_TOKENS
+
+
+def prefix_block(text: str) -> Dict[str, Any]:
+    """
+    A text content block ending a shared prompt prefix. It carries a
+    cache_control breakpoint only when the prefix is long enough to be
+    cached; otherwise the breakpoint would never take effect.
+    """
+    block = {"type": "text", "text": text}
+    if is_cacheable(text):
+        block["cache_control"] = CACHE_CONTROL
+    return block
+
+
+class UsageTracker:
+    """
+    Accumulates call counts, response-cache hits and token usage over a set
+    of LLM calls (e.g. one stage of one request). Response-cache hits cost
+    no tokens. Prompt-cache reads and writes are counted separately from
+    uncached input tokens, as the API reports them.
+    """
+
+    FIELDS = ("calls", "cache_hits", "input_tokens", "output_tokens",
+              "cache_read_input_tokens", "cache_creation_input_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+
+    def record(self, message: Any, cached: bool):
+        self.calls += 1
+        if cached:
+            self.cache_hits += 1
+            return
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            self.input_tokens += usage.input_tokens or 0
+            self.output_tokens += usage.output_tokens or 0
+            self.cache_read_input_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+            self.cache_creation_input_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class LLMClient:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        max_concurrency: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[LLMResponseCache] = None
+    ):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        self.max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+        self.keepalive_expiry = keepalive_expiry or float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "120"))
+
+        self.http_client = None
+        self._client = None
+
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+
+    @property
+    def client(self):
+        """
+        The pooled AsyncAnthropic client, built on first access.
+        """
+        return self._get_client()
+
+    def _get_client(self):
+        if self._client is None:
+            from anthropic import DEFAULT_CONNECTION_LIMITS, AsyncAnthropic, DefaultAsyncHttpxClient
+
+            # Build the transport through the SDK so it comes from the HTTP
+            # package the SDK is built on; the Limits class is taken from the
+            # SDK's own defaults for the same reason
+            limits_class = type(DEFAULT_CONNECTION_LIMITS)
+            self.http_client = DefaultAsyncHttpxClient(
+                limits=limits_class(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=self.timeout
+            )
+            self._client = AsyncAnthropic(api_key=self.api_key, http_client=self.http_client)
+        return self._client
+
+    async def warm_up(self):
+        """
+        Import the SDK off the event loop and build the client ahead of the first call.
+        """
+        await asyncio.to_thread(importlib.import_module, "anthropic")
+        self._get_client()
+
+    def is_ready(self) -> bool:
+        return self._client is not None
+
+    async def create_message(
+        self,
+        use_cache: bool = True,
+        usage: Optional[UsageTracker] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Call messages.create, waiting for a free slot under the global cap.
+        Accepts the same keyword arguments as the Anthropic SDK.
+
+        Identical requests are served from the response cache when one is
+        configured; pass use_cache=False to force a fresh call. When a usage
+        tracker is given, the call is recorded on it.
+        """
+        cache_key = None
+        if self.cache and use_cache:
+            cache_key = self.cache.make_key(**kwargs)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                message = self._message_from_cache(cached)
+                if usage:
+                    usage.record(message, cached=True)
+                return message
+
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                message = await self.client.messages.create(**kwargs)
+            finally:
+                self.in_flight -= 1
+
+        if usage:
+            usage.record(message, cached=False)
+        if cache_key is not None:
+            await self.cache.set(cache_key, message.model_dump(mode="json"))
+        return message
+
+    async def stream_message(
+        self,
+        use_cache: bool = True,
+        usage: Optional[UsageTracker] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a messages.create call under the same concurrency cap and cache.
+
+        Yields {"type": "text", "text": delta} events as tokens arrive, then a
+        final {"type": "message", "message": Message}. A cache hit is replayed
+        as a single text event.
+        """
+        cache_key = None
+        if self.cache and use_cache:
+            cache_key = self.cache.make_key(**kwargs)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                message = self._message_from_cache(cached)
+                if usage:
+                    usage.record(message, cached=True)
+                yield {"type": "text", "text": message.content[0].text}
+                yield {"type": "message", "message": message}
+                return
+
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                async with self.client.messages.stream(**kwargs) as stream:
+                    async for text in stream.text_stream:
+                        yield {"type": "text", "text": text}
+                    message = await stream.get_final_message()
+            finally:
+                self.in_flight -= 1
+
+        if usage:
+            usage.record(message, cached=False)
+        if cache_key is not None:
+            await self.cache.set(cache_key, message.model_dump(mode="json"))
+        yield {"type": "message", "message": message}
+
+    @staticmethod
+    def _message_from_cache(cached: Dict[str, Any]) -> Any:
+        from anthropic.types import Message
+
+        return Message.model_validate(cached)
+
+    def get_stats(self) -> dict:
+        """
+        Current concurrency usage, for health/diagnostic endpoints.
+        """
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "cache": self.cache.get_stats() if self.cache else None
+        }
+
+    async def close(self):
+        """
+        Close pooled connections on application shutdown.
+        """
+        if self._client is not None:
+            await self._client.close()
+            await self.http_client.aclose()
+        if self.cache:
+            self.cache.close()
@@ -9,87 +9,191 @@ Analyzes startup market landscape including:
 - ASCII visualizations
 
 Uses Claude AI and web search (max 3 calls) for comprehensive analysis.
+Web search results are cached on disk by normalized query; cache hits do
+not count against the search limit.
 """
 
-import anthropic
+import asyncio
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any
 import json
 import re
-import requests
+from urllib.parse import quote_plus
 from bs4 import BeautifulSoup
 import time
+from services.http_fetcher import HttpFetcher
+from services.llm_cache import DiskCache
+from services.llm_client import LLMClient, UsageTracker
+from services.page_enricher import PageEnricher
+from services.task_graph import TaskGraph
+
+
+@dataclass
+class MarketAnalysisContext:
+    """
+    Per-request state for one market analysis, passed through every stage so
+    the shared analyzer holds none and concurrent analyses stay independent.
+    """
+    use_cache: bool = True
+    max_web_searches: int = 3
+    web_search_count: int = 0
+    web_searches: List[Dict[str, Any]] = field(default_factory=list)
+    llm_usage: Dict[str, UsageTracker] = field(default_factory=dict)
+    enrichment: Optional[Dict[str, Any]] = None
+    timings: Dict[str, Any] = field(default_factory=dict)
+    critical_path: Dict[str, Any] = field(default_factory=dict)
+
+    def reserve_web_search(self) -> bool:
+        """
+        Take one live search from the budget; False once it is used up.
+        """
+        if self.web_search_count >= self.max_web_searches:
+            return False
+        self.web_search_count += 1
+        return True
+
+    def usage(self, stage: str) -> UsageTracker:
+        return self.llm_usage.setdefault(stage, UsageTracker())
+
+    def report(self) -> Dict[str, Any]:
+        stages = {stage: tracker.as_dict() for stage, tracker in self.llm_usage.items()}
+        total = {
+            key: sum(stage[key] for stage in stages.values())
+            for key in UsageTracker.FIELDS
+        }
+        return {
+            "timings": self.timings,
+            "critical_path": self.critical_path,
+            "web_searches": {
+                "performed": self.web_search_count,
+                "limit": self.max_web_searches,
+                "cache_hits": sum(1 for search in self.web_searches if search["cached"]),
+                "searches": self.web_searches
+            },
+            "llm_usage": {"total": total, "stages": stages},
+            "page_enrichment": self.enrichment
+        }
 
 
 class MarketInsightsAnalyzer:
-    def __init__(self, anthropic_api_key: str):
-        self.anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        http_fetcher: HttpFetcher,
+        search_cache: Optional[DiskCache] = None,
+        search_cache_ttl: float = 86400,
+        page_enricher: Optional[PageEnricher] = None
+    ):
+        self.llm_client = llm_client
+        self.http_fetcher = http_fetcher
         self.model = "claude-sonnet-4-20250514"
-        self.web_search_count = 0
+        # Live searches allowed per analysis (the count lives on the request context)
         self.max_web_searches = 3
 
-    def perform_web_search(self, query: str, num_results: int = 5) -> List[Dict[str, str]]:
+        # Parsed results by normalized query, shared across requests and restarts
+        self.search_cache = search_cache
+        self.search_cache_ttl = search_cache_ttl
+
+        # Fetches top result pages for competitor mapping; titles only without it
+        self.page_enricher = page_enricher
+
+    async def perform_web_search(
+        self,
+        query: str,
+        num_results: int = 5,
+        context: Optional[MarketAnalysisContext] = None
+    ) -> List[Dict[str, str]]:
         """
         Perform web search to gather market intelligence.
         Uses DuckDuckGo HTML search (no API key required).
 
+        Results are served from the search cache when fresh, unless the
+        context disables caching. Only live fetches count against the
+        context's search budget.
+
         Returns list of search results with title, snippet, and URL.
         """
-        if self.web_search_count >= self.max_web_searches:
-            print(f"Web search limit reached ({self.max_web_searches} searches)")
+        context = context or self.new_context()
+        cache_key = f"{num_results}:{self._normalize_query(query)}"
+        if self.search_cache and context.use_cache:
+            cached = await asyncio.to_thread(self.search_cache.get, cache_key, self.search_cache_ttl)
+            if cached is not None:
+                results, created_at = cached
+                age = round(time.time() - created_at, 1)
+                print(f"Web search cache hit ({age:.0f}s old): {query}")
+                context.web_searches.append({"query": query, "cached": True, "cache_age_seconds": age})
+                return results
+
+        if not context.reserve_web_search():
+            print(f"Web search limit reached ({context.max_web_searches} searches)")
             return []
 
         try:
-            self.web_search_count += 1
-            print(f"Performing web search {self.web_search_count}/{self.max_web_searches}: {query}")
+            print(f"Performing web search {context.web_search_count}/{context.max_web_searches}: {query}")
 
             # Use DuckDuckGo HTML search
-            search_url = f"https://html.duckduckgo.com/html/?q={requests.utils.quote(query)}"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+            search_url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
+            response = await self.http_fetcher.get(search_url)
 
-            response = requests.get(search_url, headers=headers, timeout=10)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-
-            # Parse search results
-            result_divs = soup.find_all('div', class_='result')[:num_results]
-
-            for div in result_divs:
-                title_elem = div.find('a', class_='result__a')
-                snippet_elem = div.find('a', class_='result__snippet')
-
-                if title_elem:
-                    title = title_elem.get_text(strip=True)
-                    url = title_elem.get('href', '')
-                    snippet = snippet_elem.get_text(strip=True) if snippet_elem else ''
-
-                    results.append({
-                        'title': title,
-                        'snippet': snippet,
-                        'url': url
-                    })
+            # HTML parsing is CPU-bound, keep it off the event loop
+            results = await asyncio.to_thread(self._parse_search_results, response.text, num_results)
 
             print(f"Found {len(results)} search results")
+            context.web_searches.append({"query": query, "cached": False, "cache_age_seconds": None})
+
+            # Empty result pages are usually blocks or errors, don't keep them
+            if self.search_cache and results:
+                await asyncio.to_thread(self.search_cache.set, cache_key, results)
             return results
 
         except Exception as e:
             print(f"Web search error: {e}")
             return []
 
+    def new_context(self, use_cache: bool = True) -> MarketAnalysisContext:
+        return MarketAnalysisContext(use_cache=use_cache, max_web_searches=self.max_web_searches)
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _parse_search_results(self, html: str, num_results: int) -> List[Dict[str, str]]:
+        soup = BeautifulSoup(html, 'html.parser')
+        results = []
+
+        # Parse search results
+        result_divs = soup.find_all('div', class_='result')[:num_results]
+
+        for div in result_divs:
+            title_elem = div.find('a', class_='result__a')
+            snippet_elem = div.find('a', class_='result__snippet')
+
+            if title_elem:
+                title = title_elem.get_text(strip=True)
+                url = title_elem.get('href', '')
+                snippet = snippet_elem.get_text(strip=True) if snippet_elem else ''
+
+                results.append({
+                    'title': title,
+                    'snippet': snippet,
+                    'url': url
+                })
+
+        return results
+
     async def analyze_customer_segments(
         self,
         startup_idea: str,
         ideal_customer: str,
         problem_solving: str,
         industry: str,
-        geographic_regions: str
+        geographic_regions: str,
+        context: Optional[MarketAnalysisContext] = None
     ) -> List[Dict[str, Any]]:
         """
         Identify and analyze distinct customer segments.
         """
+        context = context or self.new_context()
         prompt = f"""You are a market segmentation expert. Analyze the startup and identify 2-3 distinct customer segments.
 
 Startup: {startup_idea}
@@ -116,7 +220,9 @@ Return ONLY valid JSON:
 Be concise and specific."""
 
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.llm_client.create_message(
+                use_cache=context.use_cache,
+                usage=context.usage("segments"),
                 model=self.model,
                 max_tokens=1200,
                 messages=[{"role": "user", "content": prompt}]
@@ -140,12 +246,14 @@ Be concise and specific."""
         startup_idea: str,
         ideal_customer: str,
         problem_solving: str,
-        segments: List[Dict[str, Any]]
+        segments: List[Dict[str, Any]],
+        context: Optional[MarketAnalysisContext] = None
     ) -> List[Dict[str, Any]]:
         """
         Generate detailed customer personas (NOT interview questions).
         Creates realistic persona profiles based on segments.
         """
+        context = context or self.new_context()
         prompt = f"""Create 2-3 customer personas for this startup.
 
 Startup: {startup_idea}
@@ -172,7 +280,9 @@ Return ONLY valid JSON:
 Be concise and realistic."""
 
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.llm_client.create_message(
+                use_cache=context.use_cache,
+                usage=context.usage("personas"),
                 model=self.model,
                 max_tokens=1500,
                 messages=[{"role": "user", "content": prompt}]
@@ -197,19 +307,20 @@ Be concise and realistic."""
         industry: str,
         known_competitors: str,
         unique_value: str,
-        geographic_regions: str
+        geographic_regions: str,
+        context: Optional[MarketAnalysisContext] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
         """
         Map competitive landscape: direct, adjacent, and indirect competitors.
-        Uses web search to discover real competitors.
+        Uses web search to discover real competitors, with excerpts of the
+        top result pages when a page enricher is configured.
         """
+        context = context or self.new_context()
         # Perform web search for competitors
         search_query = f"{industry} companies {geographic_regions or ''} competitors"
-        search_results = self.perform_web_search(search_query, num_results=8)
+        search_results = await self.perform_web_search(search_query, 8, context)
 
-        search_context = "\n".join([
-            f"- {r['title']}" for r in search_results[:5]
-        ]) if search_results else "None"
+        search_context = await self._build_search_context(search_results[:5], context)
 
         prompt = f"""Map competitors for this startup.
 
@@ -254,7 +365,9 @@ Return ONLY valid JSON:
 Be concise. Use real companies from web results."""
 
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.llm_client.create_message(
+                use_cache=context.use_cache,
+                usage=context.usage("competitors"),
                 model=self.model,
                 max_tokens=2000,
                 messages=[{"role": "user", "content": prompt}]
@@ -273,17 +386,45 @@ Be concise. Use real companies from web results."""
             print(f"Error mapping competitors: {e}")
             return {"direct": [], "adjacent": [], "indirect": []}
 
+    async def _build_search_context(
+        self,
+        search_results: List[Dict[str, str]],
+        context: MarketAnalysisContext
+    ) -> str:
+        if not search_results:
+            return "None"
+
+        pages = search_results
+        if self.page_enricher:
+            enrichment = await self.page_enricher.enrich(search_results)
+            context.enrichment = enrichment["stats"]
+            pages = enrichment["pages"] + search_results[len(enrichment["pages"]):]
+
+        entries = []
+        for page in pages:
+            entry = f"- {page['title']}"
+            if page.get("url"):
+                entry += f" ({page['url']})"
+            if page.get("snippet"):
+                entry += f"\n  Snippet: {page['snippet']}"
+            if page.get("excerpt"):
+                entry += f"\n  Page excerpt: {page['excerpt']}"
+            entries.append(entry)
+        return "\n".join(entries)
+
     async def identify_market_gaps(
         self,
         startup_idea: str,
         problem_solving: str,
         industry: str,
         competitors: Dict[str, List[Dict[str, Any]]],
-        unique_value: str
+        unique_value: str,
+        context: Optional[MarketAnalysisContext] = None
     ) -> List[str]:
         """
         Identify market opportunities and gaps based on competitive analysis.
         """
+        context = context or self.new_context()
         prompt = f"""Identify 3-4 market opportunities for this startup.
 
 Startup: {startup_idea}
@@ -298,7 +439,9 @@ Return ONLY valid JSON array:
 Be specific and actionable."""
 
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.llm_client.create_message(
+                use_cache=context.use_cache,
+                usage=context.usage("market_gaps"),
                 model=self.model,
                 max_tokens=800,
                 messages=[{"role": "user", "content": prompt}]
@@ -324,11 +467,13 @@ Be specific and actionable."""
         business_model: str,
         segments: List[Dict[str, Any]],
         competitors: Dict[str, List[Dict[str, Any]]],
-        market_gaps: List[str]
+        market_gaps: List[str],
+        context: Optional[MarketAnalysisContext] = None
     ) -> str:
         """
         Generate strategic positioning recommendations.
         """
+        context = context or self.new_context()
         prompt = f"""Provide concise positioning strategy for this startup.
 
 Startup: {startup_idea}
@@ -346,7 +491,9 @@ Cover:
 Be specific and actionable. Max 150 words total."""
 
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.llm_client.create_message(
+                use_cache=context.use_cache,
+                usage=context.usage("positioning"),
                 model=self.model,
                 max_tokens=800,
                 messages=[{"role": "user", "content": prompt}]
@@ -367,7 +514,8 @@ Be specific and actionable. Max 150 words total."""
         known_competitors: Optional[str] = None,
         unique_value: Optional[str] = None,
         business_model: Optional[str] = None,
-        geographic_regions: Optional[str] = None
+        geographic_regions: Optional[str] = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Perform comprehensive market insights analysis.
@@ -379,50 +527,63 @@ Be specific and actionable. Max 150 words total."""
         - Market gaps
         - Positioning insights
         - Visualizations
+        - Per-stage timings and the critical path through the stage graph
+        - Web searches used (and cache hits) and per-stage LLM token usage,
+          including prompt-cache reads and writes
+
+        All per-request state lives on a MarketAnalysisContext, so any number
+        of analyses can run concurrently on one analyzer.
         """
         print("Starting comprehensive market analysis...")
-        self.web_search_count = 0  # Reset counter
+        context = self.new_context(use_cache)
 
         try:
-            # Step 1: Analyze customer segments
-            print("Analyzing customer segments...")
-            segments = await self.analyze_customer_segments(
-                startup_idea, ideal_customer, problem_solving, industry, geographic_regions or ""
-            )
-
-            # Step 2: Generate customer personas
-            print("Generating customer personas...")
-            personas = await self.generate_customer_personas(
-                startup_idea, ideal_customer, problem_solving, segments
-            )
-
-            # Step 3: Map competitive landscape (uses 1 web search)
-            print("Mapping competitive landscape...")
-            competitors = await self.map_competitors(
-                startup_idea, industry, known_competitors or "", unique_value or "", geographic_regions or ""
-            )
-
-            # Step 4: Identify market gaps
-            print("Identifying market opportunities...")
-            market_gaps = await self.identify_market_gaps(
-                startup_idea, problem_solving, industry, competitors, unique_value or ""
-            )
-
-            # Step 5: Generate positioning insights
-            print("Generating strategic positioning insights...")
-            positioning = await self.generate_positioning_insights(
-                startup_idea, unique_value or "", business_model or "", segments, competitors, market_gaps
-            )
+            # Stages run as a dependency graph: segments and competitors start
+            # together, personas follow segments, gaps follow competitors.
+            graph = TaskGraph()
+
+            # Analyze customer segments
+            graph.add("segments", lambda r: self.analyze_customer_segments(
+                startup_idea, ideal_customer, problem_solving, industry, geographic_regions or "", context
+            ))
+
+            # Map competitive landscape (uses 1 web search)
+            graph.add("competitors", lambda r: self.map_competitors(
+                startup_idea, industry, known_competitors or "", unique_value or "", geographic_regions or "",
+                context
+            ))
+
+            # Generate customer personas
+            graph.add("personas", lambda r: self.generate_customer_personas(
+                startup_idea, ideal_customer, problem_solving, r["segments"], context
+            ), depends_on=["segments"])
+
+            # Identify market gaps
+            graph.add("market_gaps", lambda r: self.identify_market_gaps(
+                startup_idea, problem_solving, industry, r["competitors"], unique_value or "", context
+            ), depends_on=["competitors"])
+
+            # Generate positioning insights
+            graph.add("positioning", lambda r: self.generate_positioning_insights(
+                startup_idea, unique_value or "", business_model or "",
+                r["segments"], r["competitors"], r["market_gaps"], context
+            ), depends_on=["segments", "competitors", "market_gaps"])
+
+            execution = await graph.run()
+            stages = execution["results"]
+            context.timings = execution["timings"]
+            context.critical_path = execution["critical_path"]
 
             result = {
-                "customer_segments": segments,
-                "customer_personas": personas,
-                "competitors": competitors,
-                "market_gaps": market_gaps,
-                "positioning_insights": positioning
+                "customer_segments": stages["segments"],
+                "customer_personas": stages["personas"],
+                "competitors": stages["competitors"],
+                "market_gaps": stages["market_gaps"],
+                "positioning_insights": stages["positioning"],
+                **context.report()
             }
 
-            print(f"Market analysis complete! Used {self.web_search_count} web searches.")
+            print(f"Market analysis complete! Used {context.web_search_count} web searches.")
             return result
 
         except Exception as e:
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from services.lazy_imports import lazy_import
+
+# OpenCV is imported on first use to keep application startup fast
+cv2 = lazy_import("cv2")
+
+
+class MediaDemuxer:
+    """
+    Single-pass media pipeline: one ffmpeg process demuxes the upload once and
+    writes sampled video frames and 16 kHz mono audio samples to separate pipes,
+    so nothing is decoded twice and no intermediate WAV touches the disk.
+
+    Video frames come out as raw BGR24 on an extra file descriptor (POSIX only);
+    audio comes out as float32 little-endian samples on stdout, the format
+    Whisper consumes directly.
+    """
+
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        frame_size: Tuple[int, int] = (640, 480),
+        sample_rate: int = 16000
+    ):
+        self.ffmpeg_path = ffmpeg_path
+        self.frame_size = frame_size
+        self.sample_rate = sample_rate
+
+    @staticmethod
+    def is_supported() -> bool:
+        # Passing an extra pipe to the child process requires POSIX pass_fds
+        return os.name == "posix"
+
+    def demux(
+        self,
+        video_path: str,
+        duration: float,
+        max_frames: int
+    ) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Run ffmpeg once over the video.
+
+        Only keyframes are decoded on the video side (-skip_frame nokey) and
+        the first keyframe at or after each sampling interval is kept, so video
+        decode cost scales with the number of frames rather than video length.
+
+        Returns:
+            Tuple of (list of BGR frames, float32 audio samples)
+
+        Raises:
+            subprocess.CalledProcessError if ffmpeg fails
+        """
+        width, height = self.frame_size
+        interval = max(duration / max_frames, 0.001)
+        frame_bytes = width * height * 3
+
+        video_read_fd, video_write_fd = os.pipe()
+        cmd = [
+            self.ffmpeg_path, "-v", "error", "-nostdin",
+            "-skip_frame", "nokey",  # video decoder only touches keyframes
+            "-i", video_path,
+            # Video output: sampled keyframes as raw BGR on the extra pipe
+            "-map", "0:v:0?",
+            "-vf", f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})',"
+                   f"scale={width}:{height}",
+            "-vsync", "vfr",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            f"pipe:{video_write_fd}",
+            # Audio output: 16 kHz mono float32 on stdout
+            "-map", "0:a:0?",
+            "-ac", "1", "-ar", str(self.sample_rate),
+            "-f", "f32le",
+            "pipe:1"
+        ]
+
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(video_write_fd,)
+            )
+        except Exception:
+            os.close(video_read_fd)
+            raise
+        finally:
+            # The child owns the write end now; closing ours lets reads hit EOF
+            os.close(video_write_fd)
+
+        frames: List[np.ndarray] = []
+        stderr_chunks: List[bytes] = []
+
+        def read_frames():
+            with os.fdopen(video_read_fd, "rb") as video_pipe:
+                while True:
+                    data = video_pipe.read(frame_bytes)
+                    if len(data) < frame_bytes:
+                        break
+                    # Keep draining past max_frames so ffmpeg never blocks on this pipe
+                    if len(frames) < max_frames:
+                        frames.append(np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3))
+
+        def read_stderr():
+            stderr_chunks.append(process.stderr.read())
+
+        readers = [
+            threading.Thread(target=read_frames, daemon=True),
+            threading.Thread(target=read_stderr, daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+
+        audio_bytes = process.stdout.read()
+        returncode = process.wait()
+        for reader in readers:
+            reader.join()
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, cmd, stderr=b"".join(stderr_chunks).decode("utf-8", "replace")
+            )
+
+        audio = np.frombuffer(audio_bytes, dtype=np.float32)
+        return frames, audio
+
+    def probe_duration(self, video_path: str) -> Optional[float]:
+        """
+        Container duration in seconds from the header, or None if unknown.
+        """
+        cap = cv2.VideoCapture(video_path)
+        try:
+            total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+        finally:
+            cap.release()
+
+        if total_frames > 0 and fps > 0:
+            return total_frames / fps
+        return None
@@ -0,0 +1,367 @@
+"""
+Shared Media Worker
+
+Optional standalone process that owns the Whisper models and video
+processing pools, so several API workers (uvicorn/gunicorn) can share one
+copy of each model instead of loading their own:
+- MediaWorkerServer listens on a Unix socket and runs process_video requests
+- Identical requests that arrive together (same video hash and parameters,
+  within batch_window of each other) are coalesced and processed once;
+  each distinct request runs as its own task (at most max_concurrent, by
+  default the processor's pool size), so a long video does not hold up
+  the requests behind it
+- The queue is bounded: when it is full the worker answers "busy" right away
+  instead of letting requests pile up (backpressure)
+- RemoteVideoProcessor is the client API workers use in place of VideoProcessor
+
+Run it from the backend directory with:
+    python -m services.media_worker
+
+and point the API at it with MEDIA_WORKER_SOCKET. Uploads are passed by
+path, so the worker must see the same filesystem as the API workers.
+
+Protocol: one request per connection, newline-delimited JSON. The client
+sends {"op": "process_video", ...}; the worker replies with zero or more
+{"event": "stage", "stage"} lines followed by one {"event": "result", ...}
+or {"event": "error", "detail", "busy"} line.
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Results carry base64 frames, so a single line can be several MB
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class MediaWorkerBusyError(Exception):
+    pass
+
+
+class MediaWorkerServer:
+    def __init__(
+        self,
+        processor: Any,
+        socket_path: str,
+        batch_size: Optional[int] = None,
+        batch_window: Optional[float] = None,
+        max_queued: Optional[int] = None,
+        max_concurrent: Optional[int] = None
+    ):
+        self.processor = processor
+        self.socket_path = socket_path
+        self.batch_size = batch_size or int(os.getenv("MEDIA_WORKER_BATCH_SIZE", "4"))
+        self.batch_window = batch_window if batch_window is not None else float(
+            os.getenv("MEDIA_WORKER_BATCH_WINDOW", "0.05")
+        )
+        self._queue: asyncio.Queue = asyncio.Queue(
+            maxsize=max_queued or int(os.getenv("MEDIA_WORKER_QUEUE_MAX", "32"))
+        )
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        # Groups run as their own tasks so one long video does not hold up
+        # the queue; the semaphore keeps them within the processing pool
+        self.max_concurrent = max_concurrent or getattr(processor, "max_workers", self.batch_size)
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._running: set = set()
+
+        self.batches = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def serve_forever(self):
+        Path(self.socket_path).unlink(missing_ok=True)
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.socket_path, limit=MAX_MESSAGE_BYTES
+        )
+        dispatcher = asyncio.create_task(self._dispatch())
+        print(f"Media worker listening on {self.socket_path}")
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            dispatcher.cancel()
+            for task in list(self._running):
+                task.cancel()
+            Path(self.socket_path).unlink(missing_ok=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = json.loads(await reader.readline())
+            if request.get("op") == "stats":
+                stats = self.get_stats()
+                artifact_cache = getattr(self.processor, "artifact_cache", None)
+                if artifact_cache:
+                    stats["artifacts"] = await asyncio.to_thread(artifact_cache.get_stats)
+                await self._send(writer, {"event": "result", **stats})
+                return
+            if request.get("op") != "process_video":
+                await self._send(writer, {"event": "error", "detail": f"Unknown op: {request.get('op')}"})
+                return
+
+            done = asyncio.get_running_loop().create_future()
+            try:
+                self._queue.put_nowait((request, writer, done))
+            except asyncio.QueueFull:
+                self.rejected += 1
+                await self._send(writer, {"event": "error", "detail": "Media worker is busy", "busy": True})
+                return
+
+            # The dispatcher writes the reply; keep the connection open until then
+            await done
+        except Exception as e:
+            print(f"Media worker connection error: {e}")
+        finally:
+            writer.close()
+
+    async def _dispatch(self):
+        """
+        Pull requests off the queue, coalesce identical ones that arrived
+        within the batch window, and start a task for each distinct request.
+        """
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Identical requests (same video + parameters) share one run
+            groups: Dict[str, List[Tuple[Dict[str, Any], asyncio.StreamWriter, asyncio.Future]]] = {}
+            for item in batch:
+                request = item[0]
+                key = json.dumps(
+                    [request.get("content_hash") or request["video_path"], self._options(request)],
+                    sort_keys=True
+                )
+                groups.setdefault(key, []).append(item)
+
+            self.batches += 1
+            self.requests += len(batch)
+            self.coalesced += len(batch) - len(groups)
+            for items in groups.values():
+                await self._slots.acquire()
+                task = asyncio.create_task(self._process(items))
+                self._running.add(task)
+                task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _process(self, items: List[Tuple[Dict[str, Any], asyncio.StreamWriter, asyncio.Future]]):
+        request = items[0][0]
+        writers = [writer for _, writer, _ in items]
+
+        async def on_stage_complete(stage: str):
+            await self._broadcast(writers, {"event": "stage", "stage": stage})
+
+        try:
+            frames, transcript, transcription_info = await self.processor.process_video(
+                request["video_path"],
+                content_hash=request.get("content_hash"),
+                on_stage_complete=on_stage_complete,
+                **self._options(request)
+            )
+            reply = {
+                "event": "result",
+                "frames": frames,
+                "transcript": transcript,
+                "transcription": transcription_info
+            }
+        except Exception as e:
+            print(f"Media worker error: {e}")
+            reply = {"event": "error", "detail": str(e)}
+
+        await self._broadcast(writers, reply)
+        for _, _, done in items:
+            # The connection may have been cancelled (e.g. at shutdown)
+            if not done.done():
+                done.set_result(None)
+
+    @staticmethod
+    def _options(request: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "frame_sampling": request.get("frame_sampling", "uniform"),
+            "max_frames": request.get("max_frames", 10),
+            "transcription_profile": request.get("transcription_profile")
+        }
+
+    async def _broadcast(self, writers: List[asyncio.StreamWriter], message: Dict[str, Any]):
+        for writer in writers:
+            try:
+                await self._send(writer, message)
+            except (ConnectionError, OSError):
+                # Client went away; the others still get their reply
+                pass
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+        writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queued": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "running": len(self._running),
+            "max_concurrent": self.max_concurrent,
+            "batches": self.batches,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "pool": self.processor.get_pool_stats()
+        }
+
+
+class RemoteVideoProcessor:
+    """
+    Drop-in stand-in for VideoProcessor.process_video that forwards the work
+    to a MediaWorkerServer over its Unix socket.
+    """
+
+    def __init__(self, socket_path: str, default_profile: Optional[str] = None):
+        self.socket_path = socket_path
+        self.default_profile = default_profile or os.getenv("TRANSCRIPTION_PROFILE", "balanced")
+        self.in_flight = 0
+        self.busy_rejections = 0
+        self._reachable = False
+
+    async def process_video(
+        self,
+        video_path: str,
+        frame_sampling: str = "uniform",
+        max_frames: int = 10,
+        content_hash: Optional[str] = None,
+        on_stage_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+        transcription_profile: Optional[str] = None
+    ) -> Tuple[List[str], str, Dict[str, Any]]:
+        """
+        Same contract as VideoProcessor.process_video.
+
+        Raises:
+            MediaWorkerBusyError when the worker's queue is full
+            RuntimeError if the worker reports a processing error
+        """
+        request = {
+            "op": "process_video",
+            # The worker may run from another directory
+            "video_path": os.path.abspath(video_path),
+            "frame_sampling": frame_sampling,
+            "max_frames": max_frames,
+            "content_hash": content_hash,
+            "transcription_profile": transcription_profile or self.default_profile
+        }
+
+        self.in_flight += 1
+        try:
+            async with aclosing(self._request(request)) as messages:
+                async for message in messages:
+                    if message["event"] == "stage":
+                        if on_stage_complete:
+                            await on_stage_complete(message["stage"])
+                    elif message["event"] == "result":
+                        self._reachable = True
+                        return message["frames"], message["transcript"], message["transcription"]
+                    elif message.get("busy"):
+                        self.busy_rejections += 1
+                        raise MediaWorkerBusyError(message["detail"])
+                    else:
+                        raise RuntimeError(f"Media worker error: {message['detail']}")
+        except OSError:
+            self._reachable = False
+            raise
+        finally:
+            self.in_flight -= 1
+
+        raise RuntimeError("Media worker closed the connection without a result")
+
+    async def get_worker_stats(self) -> Dict[str, Any]:
+        try:
+            async with aclosing(self._request({"op": "stats"})) as messages:
+                async for message in messages:
+                    message.pop("event", None)
+                    return message
+        except OSError:
+            self._reachable = False
+            raise
+        return {}
+
+    async def _request(self, request: Dict[str, Any]):
+        reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_MESSAGE_BYTES)
+        try:
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                yield json.loads(line)
+        finally:
+            writer.close()
+
+    async def warm_up(self):
+        """
+        Check the media worker is up; models are warmed on its side.
+        """
+        try:
+            await self.get_worker_stats()
+            self._reachable = True
+        except OSError as e:
+            print(f"Media worker not reachable at {self.socket_path}: {e}")
+
+    def get_readiness(self) -> Dict[str, bool]:
+        return {"media_worker": self._reachable}
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return {
+            "remote": self.socket_path,
+            "in_flight": self.in_flight,
+            "busy_rejections": self.busy_rejections
+        }
+
+    def shutdown(self):
+        pass
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from services.artifact_cache import ArtifactCache
+    from services.video_processor import VideoProcessor
+
+    load_dotenv()
+
+    artifact_cache = ArtifactCache(
+        cache_dir=os.getenv("ARTIFACT_CACHE_DIR", "cache/artifacts"),
+        max_bytes=int(os.getenv("ARTIFACT_CACHE_MAX_MB", "500")) * 1024 * 1024
+    )
+    processor = VideoProcessor(artifact_cache=artifact_cache)
+    server = MediaWorkerServer(processor, os.getenv("MEDIA_WORKER_SOCKET", "/tmp/pitch-coach-media.sock"))
+
+    async def run():
+        # Load models before taking requests; this process exists to hold them
+        await processor.warm_up()
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        processor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Page Enricher Service
+
+Turns web search results into compact page excerpts for prompts:
+- The top result pages are fetched concurrently, each capped at max_bytes;
+  the whole stage waits at most `timeout` seconds, and pages still loading
+  then are dropped, so added latency is bounded by one allowed fetch
+- Main text is pulled out with a streaming stdlib HTML parser that skips
+  scripts, navigation and page chrome
+- Paragraphs repeated across pages (cookie banners, boilerplate) are
+  dropped, and the rest is trimmed to a shared token budget
+- Result URLs come from third-party pages, so only http(s) URLs on public
+  addresses are fetched, and every redirect hop is checked the same way
+"""
+
+import asyncio
+import ipaddress
+import os
+import re
+import socket
+import time
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from services.http_fetcher import HttpFetcher
+
+# Rough size of one token in characters, for budgeting
+CHARS_PER_TOKEN = 4
+
+
+class _MainTextExtractor(HTMLParser):
+    """
+    Collects text from content blocks (paragraphs, headings, list items),
+    ignoring scripts, styles and navigation/header/footer chrome.
+    """
+
+    SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg"}
+    BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "li", "td", "blockquote", "section", "article", "div"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[str] = []
+        self._current: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.append(data)
+
+    def _flush(self):
+        text = " ".join("".join(self._current).split())
+        if text:
+            self.blocks.append(text)
+        self._current = []
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+class PageEnricher:
+    def __init__(
+        self,
+        http_fetcher: HttpFetcher,
+        max_pages: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        token_budget: Optional[int] = None
+    ):
+        self.http_fetcher = http_fetcher
+        self.max_pages = max_pages or int(os.getenv("ENRICH_MAX_PAGES", "4"))
+        self.max_bytes = max_bytes or int(os.getenv("ENRICH_MAX_BYTES", str(256 * 1024)))
+        self.timeout = timeout or float(os.getenv("ENRICH_TIMEOUT", "4"))
+        self.token_budget = token_budget or int(os.getenv("ENRICH_TOKEN_BUDGET", "1500"))
+
+        # Paragraphs shorter than this are usually menus, buttons or captions
+        self.min_block_chars = 60
+
+    async def enrich(self, results: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Fetch and excerpt the top search results.
+
+        Returns:
+            {"pages": [{"title", "url", "snippet", "excerpt"}], "stats": {...}}
+            in search result order; pages that failed or timed out keep their
+            snippet with an empty excerpt
+        """
+        start_time = time.perf_counter()
+        pages = [
+            {"title": r.get("title", ""), "url": self._resolve_url(r.get("url", "")), "snippet": r.get("snippet", "")}
+            for r in results[:self.max_pages]
+        ]
+
+        fetchable = [page for page in pages if page["url"]]
+        tasks = [asyncio.create_task(self._fetch_blocks(page["url"])) for page in fetchable]
+        fetched = {}
+        timed_out = 0
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+            for task in pending:
+                task.cancel()
+            timed_out = len(pending)
+            for page, task in zip(fetchable, tasks):
+                if task not in done:
+                    continue
+                if task.exception() is None:
+                    fetched[page["url"]] = task.result()
+                else:
+                    print(f"Page enrichment failed for {page['url']}: {task.exception()}")
+
+        # Drop paragraphs seen on more than one page, then share the budget
+        seen = set()
+        per_page_blocks = []
+        for page in pages:
+            blocks = []
+            for block in fetched.get(page["url"], []):
+                key = re.sub(r"\W+", " ", block.lower()).strip()
+                if key in seen:
+                    continue
+                seen.add(key)
+                blocks.append(block)
+            per_page_blocks.append(blocks)
+
+        page_budget = self.token_budget * CHARS_PER_TOKEN // max(len(pages), 1)
+        total_chars = 0
+        for page, blocks in zip(pages, per_page_blocks):
+            page["excerpt"] = self._trim(blocks, page_budget)
+            total_chars += len(page["excerpt"])
+
+        return {
+            "pages": pages,
+            "stats": {
+                "pages_requested": len(tasks),
+                "pages_fetched": len(fetched),
+                "pages_timed_out": timed_out,
+                "excerpt_tokens": total_chars // CHARS_PER_TOKEN,
+                "seconds": round(time.perf_counter() - start_time, 3)
+            }
+        }
+
+    async def _fetch_blocks(self, url: str) -> List[str]:
+        html = await self.http_fetcher.get_text(url, self.max_bytes, check_url=self._check_public_url)
+        return await asyncio.to_thread(self._extract_blocks, html)
+
+    @staticmethod
+    async def _check_public_url(url: str):
+        """
+        Refuse URLs that are not http(s) or whose host resolves to a
+        loopback, private, link-local or otherwise non-public address.
+
+        Raises:
+            ValueError if the URL is refused
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Refusing to fetch {url}")
+
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        for *_, sockaddr in addresses:
+            if not PageEnricher._is_public_address(sockaddr[0]):
+                raise ValueError(f"Refusing to fetch {url}: {parts.hostname} is not a public address")
+
+    @staticmethod
+    def _is_public_address(host: str) -> bool:
+        address = ipaddress.ip_address(host.split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        return address.is_global
+
+    def _extract_blocks(self, html: str) -> List[str]:
+        parser = _MainTextExtractor()
+        parser.feed(html)
+        parser.close()
+        return [block for block in parser.blocks if len(block) >= self.min_block_chars]
+
+    @staticmethod
+    def _trim(blocks: List[str], max_chars: int) -> str:
+        excerpt = []
+        used = 0
+        for block in blocks:
+            if used + len(block) > max_chars:
+                remaining = max_chars - used
+                if remaining > 80:
+                    excerpt.append(block[:remaining].rsplit(" ", 1)[0] + "...")
+                break
+            excerpt.append(block)
+            used += len(block) + 1
+        return " ".join(excerpt)
+
+    @staticmethod
+    def _resolve_url(url: str) -> str:
+        """
+        Unwrap DuckDuckGo redirect links (//duckduckgo.com/l/?uddg=<target>).
+        Returns "" for URLs that are not http(s) or that name a non-public
+        IP address; hostnames are checked again when fetched.
+        """
+        if url.startswith("//"):
+            url = "https:" + url
+        parts = urlsplit(url)
+        if parts.netloc.endswith("duckduckgo.com") and parts.path.startswith("/l/"):
+            target = parse_qs(parts.query).get("uddg")
+            if target:
+                url = target[0]
+                parts = urlsplit(url)
+
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return ""
+        try:
+            if not PageEnricher._is_public_address(parts.hostname):
+                return ""
+        except ValueError:
+            # A hostname rather than an IP address
+            if parts.hostname == "localhost" or parts.hostname.endswith(".localhost"):
+                return ""
+        return url
@@ -0,0 +1,180 @@
+"""
+Patent Embeddings Service
+
+Semantic similarity between an idea and candidate patents, used to score
+patent risk from how close the nearest patents actually are:
+- Texts are embedded with a local CPU sentence-transformers model
+  (optional dependency; without it patent risk falls back to count bands)
+- Corpus embeddings are precomputed for the local patent index and stored
+  as one memory-mapped record array of (patent number, float32 vector)
+  sorted by patent number, so keys and vectors are always swapped together
+- Similarity for a candidate set is one matrix-vector product over
+  L2-normalized rows; candidates without a stored embedding are encoded
+  in a single batch
+
+Build or update the corpus embeddings from the backend directory with:
+    python -m services.patent_embeddings
+"""
+
+import importlib.util
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.patent_index import PatentIndex
+
+
+class PatentEmbeddings:
+    def __init__(self, index_dir: str, model_name: Optional[str] = None):
+        self.index_dir = Path(index_dir)
+        self.model_name = model_name or os.getenv(
+            "PATENT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+        )
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._keys: Optional[np.ndarray] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._loaded_mtime: Optional[int] = None
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Whether the optional sentence-transformers package is installed.
+        """
+        return importlib.util.find_spec("sentence_transformers") is not None
+
+    def warm_up(self):
+        if self.is_available():
+            self._get_model()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as rows of an L2-normalized float32 matrix.
+        """
+        embeddings = self._get_model().encode(
+            texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def similarities(self, query: str, patents: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Cosine similarity between the query and each patent, in input order.
+        """
+        query_vector = self.encode([query])[0]
+        candidates = np.empty((len(patents), len(query_vector)), dtype=np.float32)
+
+        # Rows precomputed for the corpus are read from the memory map
+        missing = []
+        keys, matrix = self._corpus()
+        for i, patent in enumerate(patents):
+            row = self._lookup(keys, patent["patent_number"])
+            if row is None:
+                missing.append(i)
+            else:
+                candidates[i] = matrix[row]
+
+        # Everything else (e.g. scraped results) is encoded in one batch
+        if missing:
+            candidates[missing] = self.encode(
+                [f"{patents[i].get('title', '')}. {patents[i].get('abstract', '')}" for i in missing]
+            )
+
+        return candidates @ query_vector
+
+    def build(self, patent_index: PatentIndex, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Embed every indexed patent that has no stored embedding yet, then
+        rewrite the keys and vectors as a single file.
+        """
+        keys, matrix = self._corpus()
+        new_keys: List[bytes] = []
+        new_rows: List[np.ndarray] = []
+
+        for batch in patent_index.iter_documents(batch_size):
+            pending = [(number, text) for number, text in batch if self._lookup(keys, number) is None]
+            if pending:
+                new_keys.extend(number.encode("utf-8") for number, _ in pending)
+                new_rows.append(self.encode([text for _, text in pending]))
+
+        if not new_keys:
+            return {"embedded": 0, "total": 0 if keys is None else len(keys)}
+
+        all_keys = np.asarray(new_keys, dtype="S32")
+        all_rows = np.concatenate(new_rows)
+        if keys is not None:
+            all_keys = np.concatenate([np.asarray(keys), all_keys])
+            all_rows = np.concatenate([np.asarray(matrix), all_rows])
+
+        order = np.argsort(all_keys)
+        records = np.empty(
+            len(all_keys), dtype=[("key", "S32"), ("embedding", np.float32, (all_rows.shape[1],))]
+        )
+        records["key"] = all_keys[order]
+        records["embedding"] = all_rows[order]
+        self._save("embeddings", records)
+        return {"embedded": len(new_keys), "total": len(all_keys)}
+
+    def _corpus(self):
+        """
+        Memory-mapped (sorted keys, embedding matrix), or (None, None) if not built.
+        Both are views of the same file, reloaded when it is rebuilt.
+        """
+        path = self.index_dir / "embeddings.npy"
+        with self._lock:
+            try:
+                mtime = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                return None, None
+            if mtime != self._loaded_mtime:
+                records = np.load(path, mmap_mode="r")
+                self._keys = records["key"]
+                self._matrix = records["embedding"]
+                self._loaded_mtime = mtime
+            return self._keys, self._matrix
+
+    @staticmethod
+    def _lookup(keys: Optional[np.ndarray], patent_number: str) -> Optional[int]:
+        if keys is None or len(keys) == 0:
+            return None
+        key = patent_number.encode("utf-8")
+        row = int(np.searchsorted(keys, key))
+        if row < len(keys) and keys[row] == key:
+            return row
+        return None
+
+    def _save(self, name: str, array: np.ndarray):
+        path = self.index_dir / f"{name}.npy"
+        tmp_path = self.index_dir / f"{name}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+            return self._model
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    index_dir = os.getenv("PATENT_INDEX_DIR", "data/patent_index")
+    embeddings = PatentEmbeddings(index_dir)
+    if not embeddings.is_available():
+        print("sentence-transformers is not installed: pip install sentence-transformers")
+        raise SystemExit(1)
+
+    index = PatentIndex(index_dir)
+    print(embeddings.build(index))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,553 @@
+"""
+Patent Index Service
+
+Local full-text patent search over an ingested patent corpus (e.g. USPTO
+bulk grant XML or JSON Lines exports), so idea analysis needs no network:
+- Inverted index ranked with BM25 over title + abstract
+- Postings, term frequencies and document lengths are NumPy arrays on disk,
+  memory-mapped at query time; only the term dictionary is held in memory
+- Incremental ingestion: each ingest writes a new immutable segment and
+  records which source files it has seen; segments are compacted once there
+  are too many
+- Patent metadata lives in SQLite alongside the segments
+
+Ingest and query from the backend directory with:
+    python -m services.patent_index ingest path/to/ipg240102.zip more.jsonl
+    python -m services.patent_index search "wearable glucose sensor"
+
+A running API notices new segments on its next search.
+"""
+
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "which",
+    "with", "wherein", "said", "such", "thereof", "therein", "may", "can",
+    "one", "more", "least", "first", "second", "plurality"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class PatentIndex:
+    def __init__(
+        self,
+        index_dir: str,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_segments: Optional[int] = None
+    ):
+        self.index_dir = Path(index_dir)
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments or int(os.getenv("PATENT_INDEX_MAX_SEGMENTS", "8"))
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._segments: List[Dict[str, Any]] = []
+        self._manifest_mtime: Optional[float] = None
+        self._doc_count = 0
+        self._avg_length = 0.0
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def is_available(self) -> bool:
+        """
+        Whether an index with at least one document exists on disk.
+        """
+        with self._lock:
+            self._refresh()
+            return self._doc_count > 0
+
+    def search(self, query: str, limit: int = 15) -> List[Dict[str, Any]]:
+        """
+        Rank indexed patents against a free-text query with BM25.
+
+        Returns:
+            Up to `limit` patent dictionaries (patent_number, title, abstract,
+            filing_date, status, link) with a 'relevance' score, best first
+        """
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            self._refresh()
+            if self._doc_count == 0:
+                return []
+
+            # Inverse document frequencies use corpus-wide document frequencies
+            idf = {}
+            for term in terms:
+                df = sum(segment["terms"].get(term, (0, 0))[1] for segment in self._segments)
+                if df:
+                    idf[term] = np.log(1 + (self._doc_count - df + 0.5) / (df + 0.5))
+
+            candidates: List[Tuple[float, int]] = []
+            for segment in self._segments:
+                scores = self._score_segment(segment, terms, idf)
+                if scores is None:
+                    continue
+                top = self._top_k(scores, limit)
+                candidates.extend((float(scores[i]), int(segment["doc_ids"][i])) for i in top)
+
+            candidates.sort(reverse=True)
+            candidates = candidates[:limit]
+            docs = self._fetch_docs([doc_id for _, doc_id in candidates])
+
+        results = []
+        for score, doc_id in candidates:
+            doc = docs.get(doc_id)
+            if doc is not None:
+                doc["relevance"] = round(score, 3)
+                results.append(doc)
+        return results
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Yield batches of (patent_number, title + abstract) for every indexed patent.
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT doc_id, patent_number, title, abstract FROM docs WHERE doc_id > ? ORDER BY doc_id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [(number, f"{title}. {abstract}") for _, number, title, abstract in rows]
+
+    def _score_segment(
+        self,
+        segment: Dict[str, Any],
+        terms: Counter,
+        idf: Dict[str, float]
+    ) -> Optional[np.ndarray]:
+        """
+        BM25 scores for every document in the segment (None if no term matches).
+        Each term only touches its own slice of the memory-mapped postings.
+        """
+        scores = None
+        lengths = segment["lengths"]
+        for term, query_tf in terms.items():
+            entry = segment["terms"].get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            ords = segment["postings"][offset:offset + df]
+            tfs = segment["tfs"][offset:offset + df].astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths[ords] / self._avg_length)
+
+            if scores is None:
+                scores = np.zeros(len(lengths), dtype=np.float32)
+            # Ordinals are unique within a term's postings, so fancy-index += is safe
+            scores[ords] += query_tf * idf[term] * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        return matched
+
+    def _fetch_docs(self, doc_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not doc_ids:
+            return {}
+        rows = self._db().execute(
+            "SELECT doc_id, patent_number, title, abstract, filing_date, status FROM docs "
+            f"WHERE doc_id IN ({','.join('?' * len(doc_ids))})",
+            doc_ids
+        ).fetchall()
+        return {
+            row[0]: {
+                "patent_number": row[1],
+                "title": row[2],
+                "abstract": row[3],
+                "filing_date": row[4],
+                "status": row[5],
+                "link": f"https://patents.google.com/patent/{row[1]}"
+            }
+            for row in rows
+        }
+
+    def _refresh(self):
+        """
+        (Re)load segments when the manifest changed, e.g. after an ingest
+        from another process. Caller holds the lock.
+        """
+        manifest_path = self.index_dir / "manifest.json"
+        try:
+            mtime = manifest_path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+
+        with manifest_path.open("r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        segments = []
+        for name in manifest["segments"]:
+            base = self.index_dir / name
+            with (base / "terms.json").open("r", encoding="utf-8") as f:
+                terms = json.load(f)
+            segments.append({
+                "name": name,
+                "terms": terms,
+                "postings": np.load(base / "postings.npy", mmap_mode="r"),
+                "tfs": np.load(base / "tfs.npy", mmap_mode="r"),
+                "doc_ids": np.load(base / "doc_ids.npy", mmap_mode="r"),
+                "lengths": np.load(base / "lengths.npy", mmap_mode="r")
+            })
+
+        self._segments = segments
+        self._doc_count = manifest["doc_count"]
+        self._avg_length = manifest["total_length"] / max(manifest["doc_count"], 1)
+        self._manifest_mtime = mtime
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def ingest(self, paths: Iterable[str]) -> Dict[str, int]:
+        """
+        Add the patents in the given bulk files to the index as a new segment.
+        Files ingested before (same name, size and mtime) are skipped, as are
+        patents already in the index. Files in an unsupported format are
+        skipped without being recorded, so a later parser can still pick them up.
+        """
+        added = 0
+        skipped_files = 0
+        unsupported_files = 0
+        with self._lock:
+            self._refresh()
+            conn = self._db()
+            manifest = self._read_manifest()
+
+            new_docs: List[Tuple[int, List[str]]] = []
+            try:
+                for path in paths:
+                    if not is_supported_file(path):
+                        print(f"Skipping {path}: unsupported file type")
+                        unsupported_files += 1
+                        continue
+
+                    stat = os.stat(path)
+                    source = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+                    if conn.execute(
+                        "SELECT 1 FROM ingested_files WHERE path = ? AND size = ? AND mtime = ?", source
+                    ).fetchone():
+                        skipped_files += 1
+                        continue
+
+                    for patent in iter_patent_records(path):
+                        cursor = conn.execute(
+                            "INSERT OR IGNORE INTO docs (patent_number, title, abstract, filing_date, status) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (patent["patent_number"], patent["title"], patent["abstract"],
+                             patent["filing_date"], patent["status"])
+                        )
+                        if cursor.rowcount:
+                            new_docs.append((cursor.lastrowid, tokenize(f"{patent['title']} {patent['abstract']}")))
+                            added += 1
+
+                    conn.execute("INSERT OR REPLACE INTO ingested_files (path, size, mtime) VALUES (?, ?, ?)", source)
+
+                if new_docs:
+                    name = f"seg_{manifest['next_segment']:06d}"
+                    manifest["next_segment"] += 1
+                    self._write_segment(name, new_docs)
+                    manifest["segments"].append(name)
+                    manifest["doc_count"] += len(new_docs)
+                    manifest["total_length"] += sum(len(tokens) for _, tokens in new_docs)
+            except BaseException:
+                # Nothing is published unless the segment was written
+                conn.rollback()
+                raise
+
+            # Commit docs before publishing the manifest that points at them
+            conn.commit()
+            if new_docs:
+                self._write_manifest(manifest)
+                if len(manifest["segments"]) > self.max_segments:
+                    self._compact(manifest)
+            self._refresh()
+
+        return {
+            "patents_added": added,
+            "files_skipped": skipped_files,
+            "files_unsupported": unsupported_files,
+            "segments": len(self._segments),
+        }
+
+    def compact(self):
+        """
+        Merge all segments into one.
+        """
+        with self._lock:
+            self._compact(self._read_manifest())
+            self._refresh()
+
+    def _compact(self, manifest: Dict[str, Any]):
+        old_segments = manifest["segments"]
+        rows = self._db().execute("SELECT doc_id, title, abstract FROM docs ORDER BY doc_id")
+        docs = [(doc_id, tokenize(f"{title} {abstract}")) for doc_id, title, abstract in rows]
+
+        name = f"seg_{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        self._write_segment(name, docs)
+        manifest["segments"] = [name]
+        manifest["doc_count"] = len(docs)
+        manifest["total_length"] = sum(len(tokens) for _, tokens in docs)
+        self._write_manifest(manifest)
+
+        # Old segments are unreferenced now; open memory maps keep their data alive
+        for old in old_segments:
+            for path in (self.index_dir / old).glob("*"):
+                path.unlink(missing_ok=True)
+            (self.index_dir / old).rmdir()
+
+    def _write_segment(self, name: str, docs: List[Tuple[int, List[str]]]):
+        """
+        Write an immutable segment: per-term postings (local document ordinals)
+        and term frequencies laid out contiguously, plus per-document ids and lengths.
+        """
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for ordinal, (_, tokens) in enumerate(docs):
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((ordinal, tf))
+
+        terms = {}
+        ords = []
+        tfs = []
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = [len(ords), len(entries)]
+            ords.extend(ordinal for ordinal, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+
+        base = self.index_dir / name
+        base.mkdir(parents=True, exist_ok=True)
+        np.save(base / "postings.npy", np.asarray(ords, dtype=np.uint32))
+        np.save(base / "tfs.npy", np.minimum(np.asarray(tfs, dtype=np.uint32), np.iinfo(np.uint16).max).astype(np.uint16))
+        np.save(base / "doc_ids.npy", np.asarray([doc_id for doc_id, _ in docs], dtype=np.int64))
+        np.save(base / "lengths.npy", np.asarray([len(tokens) for _, tokens in docs], dtype=np.float32))
+        with (base / "terms.json").open("w", encoding="utf-8") as f:
+            json.dump(terms, f)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with (self.index_dir / "manifest.json").open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"segments": [], "next_segment": 1, "doc_count": 0, "total_length": 0}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        path = self.index_dir / "manifest.json"
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        # Atomic rename so searches never see a half-written manifest
+        os.replace(tmp_path, path)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.index_dir / "patents.db", check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "doc_id INTEGER PRIMARY KEY, patent_number TEXT UNIQUE NOT NULL, "
+                "title TEXT NOT NULL, abstract TEXT NOT NULL, filing_date TEXT, status TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingested_files ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {"patents": self._doc_count, "segments": len(self._segments)}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ----------------------------------------------------------------------
+# Bulk file readers
+# ----------------------------------------------------------------------
+
+RECORD_EXTENSIONS = (".xml", ".json", ".jsonl", ".ndjson")
+
+
+def is_supported_file(path: str) -> bool:
+    return path.endswith(".zip") or path.endswith(RECORD_EXTENSIONS)
+
+
+def iter_patent_records(path: str) -> Iterator[Dict[str, str]]:
+    """
+    Yield normalized patent records from a bulk file:
+    - USPTO grant/application full-text XML (many documents concatenated), or a .zip of them
+    - JSON Lines, or a JSON array, of objects with patent_number/title/abstract fields
+    """
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                with archive.open(member) as f:
+                    yield from _iter_stream(member, io.TextIOWrapper(f, encoding="utf-8", errors="replace"))
+    else:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            yield from _iter_stream(path, f)
+
+
+def _iter_stream(name: str, f: io.TextIOBase) -> Iterator[Dict[str, str]]:
+    if name.endswith(".xml"):
+        yield from _iter_uspto_xml(f)
+    elif name.endswith(".json"):
+        for record in json.load(f):
+            patent = _normalize_json_record(record)
+            if patent:
+                yield patent
+    elif name.endswith((".jsonl", ".ndjson")):
+        for line in f:
+            if line.strip():
+                patent = _normalize_json_record(json.loads(line))
+                if patent:
+                    yield patent
+
+
+def _iter_uspto_xml(f: io.TextIOBase) -> Iterator[Dict[str, str]]:
+    # USPTO bulk files concatenate one XML document per patent, each with its own declaration
+    buffer: List[str] = []
+    for line in f:
+        if line.startswith("<?xml") and buffer:
+            patent = _parse_uspto_document("".join(buffer))
+            if patent:
+                yield patent
+            buffer = []
+        buffer.append(line)
+    if buffer:
+        patent = _parse_uspto_document("".join(buffer))
+        if patent:
+            yield patent
+
+
+def _parse_uspto_document(document: str) -> Optional[Dict[str, str]]:
+    # Drop the declaration and DOCTYPE; entity references in the body are not needed
+    body = re.sub(r"<\?xml[^>]*\?>|<!DOCTYPE[^>]*>", "", document)
+    body = re.sub(r"&(?!amp;|lt;|gt;|quot;|apos;|#)\w+;", " ", body)
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return None
+
+    biblio = root.find("us-bibliographic-data-grant")
+    status = "Granted"
+    if biblio is None:
+        biblio = root.find("us-bibliographic-data-application")
+        status = "Application"
+    if biblio is None:
+        return None
+
+    country = biblio.findtext("publication-reference/document-id/country") or "US"
+    number = (biblio.findtext("publication-reference/document-id/doc-number") or "").lstrip("0")
+    title = biblio.findtext("invention-title") or ""
+    abstract_element = root.find("abstract")
+    abstract = " ".join("".join(abstract_element.itertext()).split()) if abstract_element is not None else ""
+    filing_date = biblio.findtext("application-reference/document-id/date") or ""
+
+    if not number or not (title or abstract):
+        return None
+
+    return {
+        "patent_number": f"{country}{number}",
+        "title": " ".join(title.split()),
+        "abstract": abstract,
+        "filing_date": _format_date(filing_date),
+        "status": status
+    }
+
+
+def _normalize_json_record(record: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    number = record.get("patent_number") or record.get("publication_number") or record.get("id")
+    title = record.get("title") or ""
+    abstract = record.get("abstract") or ""
+    if not number or not (title or abstract):
+        return None
+    return {
+        "patent_number": str(number).replace("-", ""),
+        "title": title,
+        "abstract": abstract,
+        "filing_date": _format_date(str(record.get("filing_date") or record.get("date") or "")),
+        "status": record.get("status") or "Granted"
+    }
+
+
+def _format_date(value: str) -> str:
+    # USPTO dates are YYYYMMDD
+    if re.fullmatch(r"\d{8}", value):
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    index = PatentIndex(os.getenv("PATENT_INDEX_DIR", "data/patent_index"))
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ("ingest", "search", "compact") or (command != "compact" and len(sys.argv) < 3):
+        print("Usage: python -m services.patent_index ingest FILE [FILE ...]")
+        print("       python -m services.patent_index search QUERY")
+        print("       python -m services.patent_index compact")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    if command == "ingest":
+        print(index.ingest(sys.argv[2:]))
+    elif command == "search":
+        for patent in index.search(" ".join(sys.argv[2:])):
+            print(f"{patent['relevance']:7.3f}  {patent['patent_number']}  {patent['title']}")
+    else:
+        index.compact()
+        print(index.get_stats())
+    print(f"Done in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
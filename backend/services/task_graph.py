@@ -0,0 +1,96 @@
+"""
+Task Graph Scheduler
+
+Runs async stages declared as a dependency graph with maximum parallelism:
+each stage starts as soon as all of its dependencies have finished.
+Records per-stage timings and reports the critical path.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+
+class TaskGraph:
+    def __init__(self):
+        # name -> (stage function, dependency names)
+        self._stages: Dict[str, tuple] = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[Dict[str, Any]], Awaitable[Any]],
+        depends_on: Iterable[str] = ()
+    ):
+        """
+        Register a stage. func receives the results of all finished stages
+        (at minimum its dependencies) and returns an awaitable.
+        """
+        depends_on = list(depends_on)
+        for dep in depends_on:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (func, depends_on)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Execute all stages.
+
+        Returns dictionary with:
+        - results: stage name -> stage return value
+        - timings: stage name -> {start, end, duration} in seconds from graph start
+        - critical_path: {stages, seconds} for the longest dependency chain
+        """
+        results: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, float]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        origin = time.perf_counter()
+
+        async def run_stage(name: str):
+            func, depends_on = self._stages[name]
+            if depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in depends_on))
+            start = time.perf_counter() - origin
+            results[name] = await func(results)
+            end = time.perf_counter() - origin
+            timings[name] = {
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "duration": round(end - start, 3)
+            }
+
+        # Stages are registered after their dependencies, so creation order is safe
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        return {
+            "results": results,
+            "timings": timings,
+            "critical_path": self._critical_path(timings)
+        }
+
+    def _critical_path(self, timings: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+        """
+        Walk back from the last stage to finish, following the dependency
+        that finished latest at each step.
+        """
+        if not timings:
+            return {"stages": [], "seconds": 0.0}
+
+        current = max(timings, key=lambda name: timings[name]["end"])
+        seconds = timings[current]["end"]
+        path: List[str] = [current]
+
+        while self._stages[current][1]:
+            current = max(self._stages[current][1], key=lambda name: timings[name]["end"])
+            path.append(current)
+
+        path.reverse()
+        return {"stages": path, "seconds": seconds}
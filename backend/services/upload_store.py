@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import re
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import UploadFile
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+@dataclass
+class IngestedUpload:
+    path: Path
+    sha256: str
+    size: int
+
+
+async def ingest_upload(
+    upload: UploadFile,
+    dest_dir: Path,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024
+) -> IngestedUpload:
+    """
+    Copy an upload to a unique temp path in chunks without blocking the event
+    loop, hashing the content on the way through.
+
+    The destination name is random (only the extension comes from the client),
+    so concurrent uploads with the same filename never collide.
+
+    Raises:
+        UploadTooLargeError as soon as more than max_bytes have been received
+    """
+    suffix = Path(upload.filename or "").suffix.lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", suffix):
+        suffix = ""
+    path = dest_dir / f"upload_{uuid.uuid4().hex}{suffix}"
+
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with path.open("wb") as buffer:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit"
+                    )
+
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    return IngestedUpload(path=path, sha256=digest.hexdigest(), size=size)
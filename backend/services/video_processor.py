@@ -1,19 +1,82 @@
-import cv2
+import asyncio
 import base64
-from pathlib import Path
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import os
 import shutil
-from typing import List, Tuple
-from faster_whisper import WhisperModel
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from services.artifact_cache import ArtifactCache
+from services.lazy_imports import is_loaded, lazy_import
+from services.media_pipeline import MediaDemuxer
+
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
+
+# OpenCV is imported on first use to keep application startup fast
+cv2 = lazy_import("cv2")
 
 
 class VideoProcessor:
-    def __init__(self):
-        # Initialize Whisper model (runs locally, no API key needed)
-        # Using 'base' model for balance between speed and accuracy
-        # Options: tiny, base, small, medium, large
-        self.whisper_model = WhisperModel("base", device="cpu", compute_type="int8")
+    # Named speed/accuracy trade-offs for transcription. Every profile skips
+    # silent stretches with Whisper's VAD filter before decoding.
+    TRANSCRIPTION_PROFILES = {
+        "fast": {"model": "tiny", "beam_size": 1, "vad_filter": True},
+        "balanced": {"model": "base", "beam_size": 5, "vad_filter": True},
+        "accurate": {"model": "small", "beam_size": 5, "vad_filter": True}
+    }
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        artifact_cache: Optional[ArtifactCache] = None
+    ):
+        # Bounded pool for the blocking decode/ffmpeg/Whisper work. Threads are
+        # enough here: OpenCV, the ffmpeg subprocess and CTranslate2 all release
+        # the GIL, and a single Whisper model can be shared between workers.
+        self.max_workers = max_workers or int(os.getenv("VIDEO_WORKERS", "4"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="video"
+        )
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+
+        # Frames + transcripts of previously processed videos, by content hash
+        self.artifact_cache = artifact_cache
+
+        # Every extracted frame is resized to this (width, height)
+        self.frame_size = (640, 480)
+
+        # Placeholders returned instead of a transcript when transcription fails
+        self.transcription_error_prefixes = ("[Audio transcription failed", "[FFmpeg")
+
+        # Scene-change sampling compares this many candidates per kept frame
+        self.scene_candidates_per_frame = int(os.getenv("SCENE_CANDIDATES_PER_FRAME", "4"))
+
+        # Long audio is split at silences into chunks of roughly this length and
+        # the chunks are transcribed in parallel, one per transcription worker
+        self.chunk_seconds = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "30"))
+        cpu_count = os.cpu_count() or 1
+        self.transcribe_workers = int(os.getenv("TRANSCRIBE_WORKERS") or max(1, cpu_count // 4))
+        self.transcribe_executor = ThreadPoolExecutor(
+            max_workers=self.transcribe_workers,
+            thread_name_prefix="transcribe"
+        )
+
+        self.cpu_threads_per_worker = max(1, cpu_count // self.transcribe_workers)
+
+        # Whisper models (run locally, no API key needed) are loaded on first
+        # use of a profile (or by warm_up) and kept for the life of the process
+        self.default_profile = os.getenv("TRANSCRIPTION_PROFILE", "balanced")
+        if self.default_profile not in self.TRANSCRIPTION_PROFILES:
+            raise ValueError(f"TRANSCRIPTION_PROFILE must be one of: {', '.join(self.TRANSCRIPTION_PROFILES)}")
+        self._whisper_models: Dict[str, "WhisperModel"] = {}
+        self._whisper_lock = threading.Lock()
 
         # Check if FFmpeg is available
         self.ffmpeg_path = shutil.which("ffmpeg")
@@ -22,106 +85,472 @@ class VideoProcessor:
             print("Please install FFmpeg: https://ffmpeg.org/download.html")
             print("Or use Chocolatey: choco install ffmpeg")
 
-    async def process_video(self, video_path: str) -> Tuple[List[str], str]:
+        # Single-pass demux of frames + audio, when ffmpeg and pass_fds are available
+        self.demuxer = None
+        if self.ffmpeg_path and MediaDemuxer.is_supported():
+            self.demuxer = MediaDemuxer(self.ffmpeg_path, frame_size=self.frame_size)
+
+    async def process_video(
+        self,
+        video_path: str,
+        frame_sampling: str = "uniform",
+        max_frames: int = 10,
+        content_hash: Optional[str] = None,
+        on_stage_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+        transcription_profile: Optional[str] = None
+    ) -> Tuple[List[str], str, Dict[str, Any]]:
         """
         Process video to extract frames and transcribe audio
-        Returns: (list of base64 encoded frames, transcript text)
+        Returns: (list of base64 encoded frames, transcript text, transcription metadata)
+
+        When content_hash is given, results are reused from (and saved to)
+        the artifact cache. on_stage_complete, if given, is awaited with
+        "frames" and "transcription" as each stage finishes.
+        """
+        async def stage_complete(*stages: str):
+            if on_stage_complete:
+                for stage in stages:
+                    await on_stage_complete(stage)
+
+        profile = transcription_profile or self.default_profile
+
+        cache_key = None
+        if self.artifact_cache and content_hash:
+            cache_key = ArtifactCache.make_key(
+                content_hash,
+                transcription=self.TRANSCRIPTION_PROFILES[profile],
+                max_frames=max_frames,
+                frame_sampling=frame_sampling,
+                resolution=list(self.frame_size)
+            )
+            cached = await asyncio.to_thread(self.artifact_cache.get, cache_key)
+            if cached is not None:
+                print(f"Reusing cached frames and transcript for video {content_hash[:12]}")
+                await stage_complete("frames", "transcription")
+                frames, transcript, transcription_info = cached
+                # Stats from the run that produced the entry, when it stored them
+                return frames, transcript, {**(transcription_info or {"profile": profile}), "cached": True}
+
+        frames, transcript, transcription_info = await self._process_uncached(
+            video_path, frame_sampling, max_frames, profile, stage_complete
+        )
+
+        # Failed transcriptions are not cached so a retry can succeed
+        if cache_key and not self._is_transcription_error(transcript):
+            await asyncio.to_thread(self.artifact_cache.set, cache_key, frames, transcript, transcription_info)
+
+        return frames, transcript, transcription_info
+
+    async def _process_uncached(
+        self,
+        video_path: str,
+        frame_sampling: str,
+        max_frames: int,
+        profile: str,
+        stage_complete: Callable[..., Awaitable[None]]
+    ) -> Tuple[List[str], str, Dict[str, Any]]:
+        # Uniform sampling can share one ffmpeg decode for frames and audio
+        if self.demuxer and frame_sampling == "uniform":
+            try:
+                result = await self._run_in_pool(self._process_single_pass, video_path, max_frames, profile)
+            except Exception as e:
+                print(f"Single-pass demux failed, falling back to separate passes: {e}")
+            else:
+                await stage_complete("frames", "transcription")
+                return result
+
+        async def frames_stage():
+            frames = await self.extract_frames(video_path, max_frames=max_frames, sampling=frame_sampling)
+            await stage_complete("frames")
+            return frames
+
+        async def transcription_stage():
+            result = await self.transcribe_audio(video_path, profile)
+            await stage_complete("transcription")
+            return result
+
+        # Frame extraction and transcription are independent, run them side by side
+        frames, (transcript, transcription_info) = await asyncio.gather(frames_stage(), transcription_stage())
+        return frames, transcript, transcription_info
+
+    def _is_transcription_error(self, transcript: str) -> bool:
+        return transcript.startswith(self.transcription_error_prefixes)
+
+    def _process_single_pass(
+        self,
+        video_path: str,
+        max_frames: int,
+        profile: str
+    ) -> Tuple[List[str], str, Dict[str, Any]]:
+        """
+        Demux the upload once, feeding sampled frames to the JPEG encoder and
+        raw PCM straight to Whisper.
         """
-        frames = await self.extract_frames(video_path)
-        transcript = await self.transcribe_audio(video_path)
-        return frames, transcript
+        duration = self.demuxer.probe_duration(video_path)
+        if not duration:
+            raise ValueError("video duration unknown")
 
-    async def extract_frames(self, video_path: str, max_frames: int = 10) -> List[str]:
+        frames, audio = self.demuxer.demux(video_path, duration, max_frames)
+
+        # Sparse keyframes (e.g. some browser recordings) can leave too few
+        # frames; top up with the seek-based sampler in that case
+        if len(frames) < max_frames // 2:
+            frames_b64 = self._extract_frames_sync(video_path, max_frames, "uniform")
+        else:
+            frames_b64 = [self._encode_frame(frame) for frame in frames]
+
+        try:
+            transcript, transcription_info = self._transcribe_samples(audio, profile)
+        except Exception as e:
+            print(f"Transcription error: {str(e)}")
+            transcript, transcription_info = f"[Audio transcription failed: {str(e)}]", {"profile": profile}
+
+        return frames_b64, transcript, transcription_info
+
+    async def _run_in_pool(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Run blocking work on the bounded executor, tracking queue depth.
+        """
+        with self._stats_lock:
+            self._queued += 1
+
+        def run():
+            with self._stats_lock:
+                self._queued -= 1
+                self._active += 1
+            try:
+                return func(*args)
+            finally:
+                with self._stats_lock:
+                    self._active -= 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, run)
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        """
+        Executor usage: jobs waiting for a worker and jobs currently running.
+        """
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "active": self._active
+            }
+
+    async def warm_up(self):
+        """
+        Load OpenCV and the default profile's Whisper model in the background,
+        so the first request doesn't pay for it.
+        """
+        await asyncio.to_thread(self._warm_up_sync)
+
+    def _warm_up_sync(self):
+        importlib.import_module("cv2")
+        self._get_whisper_model(self.TRANSCRIPTION_PROFILES[self.default_profile]["model"])
+
+    def get_readiness(self) -> Dict[str, bool]:
+        """
+        Which subsystems are loaded and usable without a cold start.
+        """
+        return {
+            "whisper": self.TRANSCRIPTION_PROFILES[self.default_profile]["model"] in self._whisper_models,
+            "opencv": is_loaded("cv2"),
+            "ffmpeg": self.ffmpeg_path is not None
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.transcribe_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def extract_frames(
+        self,
+        video_path: str,
+        max_frames: int = 10,
+        sampling: str = "uniform"
+    ) -> List[str]:
         """
         Extract key frames from video and encode as base64
+
+        sampling:
+        - "uniform": frames evenly spaced through the video
+        - "scene": frames at the largest visual changes (e.g. slide transitions)
         """
+        return await self._run_in_pool(self._extract_frames_sync, video_path, max_frames, sampling)
+
+    def _extract_frames_sync(self, video_path: str, max_frames: int, sampling: str) -> List[str]:
         frames_b64 = []
 
         cap = cv2.VideoCapture(video_path)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
 
-        # Extract frames at regular intervals
         if total_frames == 0:
             cap.release()
             return frames_b64
 
-        # Sample frames evenly throughout the video
-        frame_interval = max(1, total_frames // max_frames)
+        # Only the frames we keep are decoded, so cost scales with max_frames
+        # rather than with video length
+        if sampling == "scene":
+            frames = self._sample_scene_changes(cap, total_frames, fps, max_frames)
+        else:
+            frames = [
+                frame for _, frame in self._read_frames_at(
+                    cap, self._uniform_indices(total_frames, max_frames), fps
+                )
+            ]
+
+        frames_b64 = [self._encode_frame(frame) for frame in frames]
+
+        cap.release()
+        return frames_b64
+
+    def _encode_frame(self, frame) -> str:
+        # Encode frame as JPEG
+        _, buffer = cv2.imencode('.jpg', frame)
+
+        # Convert to base64
+        return base64.b64encode(buffer).decode('utf-8')
+
+    def _uniform_indices(self, total_frames: int, count: int) -> List[int]:
+        """
+        Frame indices evenly spaced through the video, starting at frame 0
+        """
+        frame_interval = max(1, total_frames // count)
+        return [i * frame_interval for i in range(count) if i * frame_interval < total_frames]
+
+    def _read_frames_at(self, cap, indices: List[int], fps: float):
+        """
+        Yield (index, resized frame) for each target index in ascending order.
+
+        Short gaps are skipped with grab(), which demuxes without converting
+        the frame; longer gaps seek, which only decodes from the nearest
+        keyframe before the target.
+        """
+        seek_threshold = max(1, int(fps * 2))
+        position = 0
+
+        for index in indices:
+            gap = index - position
+            if gap < 0 or gap > seek_threshold:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            else:
+                for _ in range(gap):
+                    if not cap.grab():
+                        return
 
-        frame_count = 0
-        while len(frames_b64) < max_frames:
             ret, frame = cap.read()
             if not ret:
-                break
+                return
+            position = index + 1
 
-            if frame_count % frame_interval == 0:
-                # Resize frame to reduce size
-                frame = cv2.resize(frame, (640, 480))
+            # Resize frame to reduce size
+            yield index, cv2.resize(frame, self.frame_size)
 
-                # Encode frame as JPEG
-                _, buffer = cv2.imencode('.jpg', frame)
+    def _sample_scene_changes(self, cap, total_frames: int, fps: float, max_frames: int) -> List:
+        """
+        Pick frames at the biggest visual changes between evenly spaced
+        candidates, using cheap colour histogram differences.
+        """
+        candidates = self._uniform_indices(total_frames, max_frames * self.scene_candidates_per_frame)
+        frames = []
+        changes = []
+        previous_hist = None
 
-                # Convert to base64
-                frame_b64 = base64.b64encode(buffer).decode('utf-8')
-                frames_b64.append(frame_b64)
+        for index, frame in self._read_frames_at(cap, candidates, fps):
+            small = cv2.resize(frame, (160, 120))
+            hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+            hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+            cv2.normalize(hist, hist)
 
-            frame_count += 1
+            if previous_hist is None:
+                # Always keep the opening frame
+                change = float("inf")
+            else:
+                change = cv2.compareHist(previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
 
-        cap.release()
-        return frames_b64
+            frames.append(frame)
+            changes.append(change)
+            previous_hist = hist
+
+        # Keep the largest transitions, then restore chronological order
+        ranked = sorted(range(len(frames)), key=lambda i: changes[i], reverse=True)[:max_frames]
+        return [frames[i] for i in sorted(ranked)]
 
-    async def transcribe_audio(self, video_path: str) -> str:
+    async def transcribe_audio(self, video_path: str, profile: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
         """
         Extract and transcribe audio from video using Whisper (local, no API key)
+        Returns: (transcript text, transcription metadata)
         """
+        return await self._run_in_pool(self._transcribe_audio_sync, video_path, profile or self.default_profile)
+
+    def _transcribe_audio_sync(self, video_path: str, profile: str) -> Tuple[str, Dict[str, Any]]:
+        failed = {"profile": profile}
+
         # Check if FFmpeg is available
         if not self.ffmpeg_path:
             error_msg = "FFmpeg is not installed or not in PATH. Please install FFmpeg to enable audio transcription."
             print(f"ERROR: {error_msg}")
-            return f"[{error_msg}]"
-
-        # Extract audio from video
-        audio_path = video_path.replace(Path(video_path).suffix, ".wav")
+            return f"[{error_msg}]", failed
 
         try:
-            # Use ffmpeg to extract audio
+            # Use ffmpeg to decode audio straight to stdout as raw float32
+            # samples, so nothing is written to (or re-read from) disk
             ffmpeg_cmd = [
-                self.ffmpeg_path, "-i", video_path,
+                self.ffmpeg_path, "-nostdin", "-i", video_path,
                 "-vn",  # no video
-                "-acodec", "pcm_s16le",  # audio codec
+                "-f", "f32le",  # raw float32 little-endian samples
                 "-ar", "16000",  # sample rate
                 "-ac", "1",  # mono
-                audio_path,
-                "-y"  # overwrite
+                "pipe:1"
             ]
 
             result = subprocess.run(
                 ffmpeg_cmd,
                 check=True,
-                capture_output=True,
-                text=True
+                capture_output=True
             )
 
-            # Transcribe using Whisper
-            segments, info = self.whisper_model.transcribe(audio_path, beam_size=5)
-
-            # Combine all segments into full transcript
-            transcript = " ".join([segment.text for segment in segments])
-
-            # Cleanup audio file
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
+            # Zero-copy view over the pipe buffer, in the format Whisper expects
+            samples = np.frombuffer(result.stdout, dtype=np.float32)
 
-            return transcript.strip()
+            # Transcribe using Whisper
+            return self._transcribe_samples(samples, profile)
 
         except subprocess.CalledProcessError as e:
-            error_detail = e.stderr if e.stderr else str(e)
+            error_detail = e.stderr.decode("utf-8", "replace") if e.stderr else str(e)
             print(f"FFmpeg error: {error_detail}")
-            return f"[Audio transcription failed - FFmpeg error: {error_detail}]"
+            return f"[Audio transcription failed - FFmpeg error: {error_detail}]", failed
         except FileNotFoundError as e:
             print(f"File not found error: {str(e)}")
-            return "[FFmpeg not found. Please install FFmpeg and add it to your PATH.]"
+            return "[FFmpeg not found. Please install FFmpeg and add it to your PATH.]", failed
         except Exception as e:
             print(f"Transcription error: {str(e)}")
-            return f"[Audio transcription failed: {str(e)}]"
+            return f"[Audio transcription failed: {str(e)}]", failed
+
+    def _transcribe_samples(
+        self,
+        audio: np.ndarray,
+        profile: str,
+        sample_rate: int = 16000
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Run Whisper over a float32 16 kHz mono sample array using a named profile.
+
+        The audio is split at silences and the chunks are transcribed in
+        parallel, then stitched back together in timestamp order. Returns the
+        transcript and metadata including the real-time factor (processing
+        time / audio duration; lower is faster).
+        """
+        settings = self.TRANSCRIPTION_PROFILES[profile]
+        audio_seconds = len(audio) / sample_rate
+        start_time = time.perf_counter()
+
+        if len(audio) == 0:
+            segments, speech_seconds = [], 0.0
+        else:
+            model = self._get_whisper_model(settings["model"])
+            spans = self._split_at_silences(audio, sample_rate)
+
+            futures = [
+                self.transcribe_executor.submit(
+                    self._transcribe_chunk, model, settings, audio[start:end], start / sample_rate
+                )
+                for start, end in spans
+            ]
+            results = [future.result() for future in futures]
+            segments = sorted(
+                (segment for chunk_segments, _ in results for segment in chunk_segments),
+                key=lambda segment: segment["start"]
+            )
+            speech_seconds = sum(chunk_speech for _, chunk_speech in results)
+
+        processing_seconds = time.perf_counter() - start_time
+
+        # Combine all segments into full transcript
+        transcript = " ".join([segment["text"].strip() for segment in segments])
+
+        return transcript.strip(), {
+            "profile": profile,
+            "model": settings["model"],
+            "beam_size": settings["beam_size"],
+            "vad_filter": settings["vad_filter"],
+            "audio_seconds": round(audio_seconds, 2),
+            "speech_seconds": round(speech_seconds, 2),
+            "processing_seconds": round(processing_seconds, 2),
+            "real_time_factor": round(processing_seconds / audio_seconds, 3) if audio_seconds else None
+        }
+
+    def _transcribe_chunk(
+        self,
+        model: "WhisperModel",
+        settings: Dict[str, Any],
+        audio: np.ndarray,
+        offset: float
+    ) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Transcribe one chunk, shifting segment timestamps by its offset in seconds.
+        Returns (segments, seconds of speech left after VAD).
+        """
+        segments, info = model.transcribe(
+            audio,
+            beam_size=settings["beam_size"],
+            vad_filter=settings["vad_filter"]
+        )
+
+        # segments is lazy; consume it here so decoding happens on this worker
+        chunk_segments = [
+            {"start": offset + segment.start, "end": offset + segment.end, "text": segment.text}
+            for segment in segments
+        ]
+        # 0.0 after VAD is a chunk without speech, not a missing value
+        speech_seconds = getattr(info, "duration_after_vad", None)
+        if speech_seconds is None:
+            speech_seconds = info.duration
+        return chunk_segments, speech_seconds
+
+    def _get_whisper_model(self, name: str) -> "WhisperModel":
+        """
+        Load (once) and return the Whisper model with the given size.
+        num_workers gives each transcription worker its own model replica;
+        cores are shared out between them.
+        """
+        with self._whisper_lock:
+            if name not in self._whisper_models:
+                from faster_whisper import WhisperModel
+
+                self._whisper_models[name] = WhisperModel(
+                    name,
+                    device="cpu",
+                    compute_type="int8",
+                    num_workers=self.transcribe_workers,
+                    cpu_threads=self.cpu_threads_per_worker
+                )
+            return self._whisper_models[name]
+
+    def _split_at_silences(self, audio: np.ndarray, sample_rate: int) -> List[Tuple[int, int]]:
+        """
+        Split audio into (start, end) sample spans of about chunk_seconds,
+        cutting at the quietest 30 ms frame within a few seconds of each target
+        boundary so words are not split between chunks.
+        """
+        chunk = int(self.chunk_seconds * sample_rate)
+        if len(audio) <= chunk * 1.5:
+            return [(0, len(audio))]
+
+        # RMS energy per 30 ms frame
+        frame = int(0.03 * sample_rate)
+        frame_count = len(audio) // frame
+        frames = audio[:frame_count * frame].reshape(frame_count, frame)
+        energy = np.sqrt(np.mean(np.square(frames), axis=1))
+
+        search = int(5 * sample_rate) // frame  # look +/- 5 s around each target
+        bounds = [0]
+        while len(audio) - bounds[-1] > chunk * 1.5:
+            target = (bounds[-1] + chunk) // frame
+            low = max(target - search, bounds[-1] // frame + 1)
+            high = min(target + search, frame_count)
+            bounds.append((low + int(np.argmin(energy[low:high]))) * frame)
+        bounds.append(len(audio))
+
+        return list(zip(bounds[:-1], bounds[1:]))
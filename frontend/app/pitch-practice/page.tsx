@@ -14,6 +14,7 @@ export default function PitchPractice() {
   const [isAnalyzing, setIsAnalyzing] = useState(false)
   const [analysis, setAnalysis] = useState<any>(null)
   const [transcript, setTranscript] = useState<string>('')
+  const [streamingFeedback, setStreamingFeedback] = useState<string>('')
 
   const handleAnalysisComplete = (result: any) => {
     setAnalysis(result.analysis)
@@ -24,6 +25,7 @@ export default function PitchPractice() {
   const handleReset = () => {
     setAnalysis(null)
     setTranscript('')
+    setStreamingFeedback('')
     setIsAnalyzing(false)
   }
 
@@ -74,8 +76,13 @@ export default function PitchPractice() {
             {/* Video Upload */}
             <VideoUploader
               persona={selectedPersona}
-              onAnalysisStart={() => setIsAnalyzing(true)}
+              onAnalysisStart={() => {
+                setStreamingFeedback('')
+                setIsAnalyzing(true)
+              }}
               onAnalysisComplete={handleAnalysisComplete}
+              onAnalysisProgress={setStreamingFeedback}
+              onAnalysisError={() => setIsAnalyzing(false)}
               isAnalyzing={isAnalyzing}
             />
 
@@ -99,6 +106,11 @@ export default function PitchPractice() {
                   <div className="w-2 h-2 bg-purple-500 rounded-full animate-bounce delay-100"></div>
                   <div className="w-2 h-2 bg-pink-500 rounded-full animate-bounce delay-200"></div>
                 </div>
+                {streamingFeedback && (
+                  <div className="mt-8 text-left max-h-96 overflow-y-auto p-6 bg-slate-900/50 rounded-xl border border-slate-700/50 text-slate-300 whitespace-pre-wrap">
+                    {streamingFeedback}
+                  </div>
+                )}
               </div>
             )}
           </div>
@@ -1,6 +1,5 @@
 import { useState, useRef } from 'react'
 import { Upload, Video, X } from 'lucide-react'
-import axios from 'axios'
 
 type PersonaType = 'investor' | 'advisor' | 'healthcare' | 'edtech' | 'tech'
 
@@ -8,6 +7,8 @@ interface VideoUploaderProps {
   persona: PersonaType
   onAnalysisStart: () => void
   onAnalysisComplete: (result: any) => void
+  onAnalysisProgress?: (feedback: string) => void
+  onAnalysisError?: () => void
   isAnalyzing: boolean
 }
 
@@ -15,6 +16,8 @@ export default function VideoUploader({
   persona,
   onAnalysisStart,
   onAnalysisComplete,
+  onAnalysisProgress,
+  onAnalysisError,
   isAnalyzing
 }: VideoUploaderProps) {
   const [videoFile, setVideoFile] = useState<File | null>(null)
@@ -135,21 +138,61 @@ export default function VideoUploader({
     formData.append('persona', persona)
 
     try {
-      const response = await axios.post(
-        'http://localhost:8000/api/analyze-pitch',
-        formData,
-        {
-          headers: {
-            'Content-Type': 'multipart/form-data'
-          },
-          timeout: 300000 // 5 minutes timeout
+      // Stream feedback as Server-Sent Events so it appears while Claude writes it
+      const response = await fetch('http://localhost:8000/api/analyze-pitch/stream', {
+        method: 'POST',
+        body: formData
+      })
+
+      if (!response.ok || !response.body) {
+        const body = await response.json().catch(() => null)
+        throw new Error(body?.detail || 'Failed to analyze pitch. Please try again.')
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let feedback = ''
+      let finished = false
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop() || ''
+
+        for (const rawEvent of events) {
+          let eventName = 'message'
+          let data = ''
+          for (const line of rawEvent.split('\n')) {
+            if (line.startsWith('event: ')) eventName = line.slice(7)
+            else if (line.startsWith('data: ')) data += line.slice(6)
+          }
+          if (!data) continue
+          const payload = JSON.parse(data)
+
+          if (eventName === 'token') {
+            feedback += payload.text
+            onAnalysisProgress?.(feedback)
+          } else if (eventName === 'result') {
+            finished = true
+            onAnalysisComplete(payload)
+          } else if (eventName === 'error') {
+            throw new Error(payload.detail)
+          }
         }
-      )
+      }
 
-      onAnalysisComplete(response.data)
+      // The stream can end early (proxy cut, server crash) without a result or error event
+      if (!finished) {
+        throw new Error('Connection lost before the analysis finished. Please try again.')
+      }
     } catch (err: any) {
-      setError(err.response?.data?.detail || 'Failed to analyze pitch. Please try again.')
+      setError(err.message || 'Failed to analyze pitch. Please try again.')
       console.error('Analysis error:', err)
+      onAnalysisError?.()
     }
   }
 